@@ -1,55 +1,133 @@
 import os
 import json
+import time
 import uuid
+import asyncio
 import logging
-from telethon import TelegramClient
-from telethon.errors import SessionPasswordNeededError
+from telethon.errors import SessionPasswordNeededError, FloodWaitError
 from telethon.tl.functions.channels import JoinChannelRequest
 from telethon.tl.functions.messages import ImportChatInviteRequest
-from storage import Storage
+from storage import get_storage
 from forwarder import Forwarder
+from runtime import runtime, run_io, run_blocking
+from scheduler import JobScheduler, QueueFull, JobConflict, FINISHED_STATUSES
+from job_store import JobStore
+from entity_cache import entity_cache, cache_keys
+from client_pool import ClientPool
+from progress_bus import progress_bus, ProgressBus
+from rate_limiter import limiter
+from metrics import registry
 
 logger = logging.getLogger(__name__)
 
+# Sessions reconnected at once after a restart, and the delay between starts
+REHYDRATE_CONCURRENCY = int(os.environ.get("REHYDRATE_CONCURRENCY", 10))
+REHYDRATE_STAGGER = float(os.environ.get("REHYDRATE_STAGGER", 0.2))
+
+# Links resolved at once by a bulk import, and retries after a FloodWait
+IMPORT_CONCURRENCY = int(os.environ.get("IMPORT_CONCURRENCY", 5))
+IMPORT_MAX_RETRIES = int(os.environ.get("IMPORT_MAX_RETRIES", 3))
+
+# How many finished bulk imports keep their result for polling
+MAX_FINISHED_IMPORTS = int(os.environ.get("MAX_FINISHED_IMPORTS", 50))
+
+# Checkpoint statuses of runs a previous process left unfinished: running
+# after a crash, interrupted after a shutdown
+RESUMABLE_STATUSES = ('running', 'interrupted')
+
+def parse_links(text):
+    """Split text (one link per line, or separated by spaces or commas) into unique links."""
+    links = []
+    for link in text.replace(',', ' ').split():
+        if link not in links:
+            links.append(link)
+    return links
+
 class BotManager:
     def __init__(self):
-        self.clients = {}  # Maps phone numbers to client instances
-        self.storage = Storage()
+        self.clients = ClientPool()  # Connects each account's client on demand
+        self.pending_logins = set()  # Phones whose client is pinned until the code arrives
+        self.storage = get_storage()
         self.forwarders = {}  # Maps phone numbers to forwarder instances
         self.active_tasks = {}  # Maps phone numbers to active forwarding tasks
+        self.job_progress = {}  # Maps job IDs to their latest progress event
+        self.imports = {}  # Maps bulk import IDs to their status and, once done, result
+        self.runtime = runtime  # Shared event loop that owns all clients and jobs
+        self.scheduler = JobScheduler(self.runtime, store=JobStore())  # Queues and runs jobs per account
+        self.bot_running = False  # Whether the bot was started from the web app
+        self.bot_status_bus = ProgressBus()  # Tells status streams when the bot is started or stopped
+        
+        # Keep the status snapshot current without reading storage
+        progress_bus.subscribe(self._on_progress)
+        
+        # Gauges are read from live state only when /metrics is scraped
+        registry.gauge('forwarder_jobs', 'Jobs of this process by status.', ('status',),
+                       callback=lambda: {(status,): count for status, count in self.scheduler.status_counts().items()})
+        registry.gauge('forwarder_job_queue_depth', 'Jobs waiting for a free slot.',
+                       callback=lambda: {(): self.scheduler.queue_depth()['queued']})
+        registry.gauge('telegram_clients_connected', 'Telegram clients currently connected.',
+                       callback=lambda: {(): len(self.clients.connected)})
         
         # Create the sessions directory if it doesn't exist
         if not os.path.exists('sessions'):
             os.makedirs('sessions')
 
+    def _on_progress(self, event):
+        """Record the latest progress event of a job, folding finished jobs into their task."""
+        job_id = event.get('job_id')
+        if not job_id:
+            return
+        
+        if event.get('status') not in FINISHED_STATUSES:
+            self.job_progress[job_id] = event
+            return
+        
+        # The job store keeps the final state; only the status snapshot needs it here
+        self.job_progress.pop(job_id, None)
+        task = self.active_tasks.get(event.get('phone'))
+        if task and task.get('job_id') == job_id:
+            task['total_messages'] = event['total_messages']
+            task['forwarded_messages'] = event['forwarded_messages']
+            task['last_forwarded_id'] = event['last_forwarded_id']
+            task['status'] = event['status']
+            task['error'] = event.get('error')
+
+    async def _with_client(self, phone, use):
+        """Run ``use(client)`` with the account's client connected and pinned."""
+        client = await self.clients.acquire(phone)
+        self.clients.pin(phone)
+        try:
+            return await use(client)
+        finally:
+            self.clients.unpin(phone)
+
     def initialize_bot(self, phone, api_id, api_hash):
         """Initialize a Telegram client for a user."""
         try:
-            # Create the client
-            client = TelegramClient(f'sessions/{phone}', api_id, api_hash)
-            
-            # Start the client without connecting
-            client.connect()
+            # Register the account and connect its client on the shared runtime
+            self.clients.register(phone, api_id, api_hash)
+            client = self.runtime.run(self.clients.acquire(phone))
             
             # Check if the user is already authorized
-            if client.is_user_authorized():
-                # Save the client instance
-                self.clients[phone] = client
-                
+            if self.runtime.run(client.is_user_authorized()):                
                 # Initialize user data if it doesn't exist
                 if not self.storage.user_exists(phone):
                     self.storage.create_user(phone, api_id, api_hash)
                 
-                # Initialize the forwarder for this user
-                self.forwarders[phone] = Forwarder(client, self.storage, phone)
+                # Initialize the forwarder that holds this user's checkpointer; a
+                # second one would recover, and delete, the journal running jobs append to
+                if phone not in self.forwarders:
+                    self.forwarders[phone] = Forwarder(None, self.storage, phone)
                 
                 return {"success": True, "needs_code": False}
             else:
-                # User is not authorized, send the code
-                client.send_code_request(phone)
+                # The login lives on this client until the code is submitted
+                if phone not in self.pending_logins:
+                    self.pending_logins.add(phone)
+                    self.clients.pin(phone)
                 
-                # Save the client instance
-                self.clients[phone] = client
+                # User is not authorized, send the code
+                self.runtime.run(client.send_code_request(phone))
                 
                 # Initialize user data if it doesn't exist
                 if not self.storage.user_exists(phone):
@@ -59,8 +137,8 @@ class BotManager:
         except Exception as e:
             logger.error(f"Error initializing bot for {phone}: {str(e)}")
             if phone in self.clients:
-                self.clients[phone].disconnect()
-                del self.clients[phone]
+                self.pending_logins.discard(phone)
+                self.runtime.run(self.clients.remove(phone))
             raise
 
     def submit_code(self, phone, code):
@@ -68,14 +146,18 @@ class BotManager:
         if phone not in self.clients:
             return {"success": False, "error": "Client not initialized"}
         
-        client = self.clients[phone]
+        client = self.runtime.run(self.clients.acquire(phone))
         
         try:
             # Sign in with the code
-            client.sign_in(phone, code)
+            self.runtime.run(client.sign_in(phone, code))
+            if phone in self.pending_logins:
+                self.pending_logins.discard(phone)
+                self.clients.unpin(phone)
             
-            # Initialize the forwarder for this user
-            self.forwarders[phone] = Forwarder(client, self.storage, phone)
+            # Initialize the forwarder that holds this user's checkpointer, once
+            if phone not in self.forwarders:
+                self.forwarders[phone] = Forwarder(None, self.storage, phone)
             
             return {"success": True}
         except SessionPasswordNeededError:
@@ -85,36 +167,131 @@ class BotManager:
             logger.error(f"Error signing in with code for {phone}: {str(e)}")
             return {"success": False, "error": str(e)}
 
+    async def _resolve_chat(self, phone, client, link):
+        """Resolve a chat link through the entity cache, joining the chat if it can't be resolved."""
+        try:
+            return await entity_cache.resolve(client, phone, link)
+        except FloodWaitError:
+            raise
+        except Exception:
+            key = cache_keys(link)[0]
+            if key.startswith('invite:'):
+                # Join a private channel/group with the hash of its invite link
+                updates = await client(ImportChatInviteRequest(key[len('invite:'):]))
+            else:
+                # Try to join as a public channel
+                updates = await client(JoinChannelRequest(link))
+            
+            return await run_io(entity_cache.store, phone, link, updates.chats[0])
+
+    def rehydrate(self):
+        """Reconnect saved sessions and resume their jobs in the background after a restart."""
+        return self.runtime.submit(self._rehydrate())
+
+    async def _rehydrate(self, concurrency=REHYDRATE_CONCURRENCY, stagger=REHYDRATE_STAGGER):
+        """Reconnect every account with a session file and stored credentials.
+
+        Accounts are brought back in parallel, at most ``concurrency`` at a
+        time and started ``stagger`` seconds apart so Telegram doesn't see a
+        burst of logins. Each authorized account then resumes the jobs that
+        were running when the process stopped.
+        """
+        sessions = {name[:-len('.session')] for name in os.listdir('sessions') if name.endswith('.session')}
+        phones = [phone for phone in await run_io(self.storage.list_users) if phone in sessions]
+        
+        semaphore = asyncio.Semaphore(concurrency)
+        summary = {'accounts': 0, 'jobs': 0, 'unauthorized': [], 'failed': []}
+        
+        async def rehydrate_account(index, phone):
+            await asyncio.sleep(index * stagger)
+            async with semaphore:
+                try:
+                    jobs = await self._rehydrate_account(phone)
+                except Exception as e:
+                    logger.error(f"Error rehydrating session for {phone}: {str(e)}")
+                    summary['failed'].append(phone)
+                    return
+            
+            if jobs is None:
+                summary['unauthorized'].append(phone)
+            else:
+                summary['accounts'] += 1
+                summary['jobs'] += jobs
+        
+        await asyncio.gather(*(rehydrate_account(index, phone) for index, phone in enumerate(phones)))
+        logger.info(
+            f"Rehydrated {summary['accounts']} of {len(phones)} sessions and resumed {summary['jobs']} jobs "
+            f"({len(summary['unauthorized'])} unauthorized, {len(summary['failed'])} failed)"
+        )
+        return summary
+
+    async def _rehydrate_account(self, phone):
+        """Reconnect one account and resume its interrupted jobs.
+
+        Returns how many jobs were resumed, or None if the session is no
+        longer authorized.
+        """
+        user_data = await self.storage.aget_user_data(phone)
+        if not user_data or not user_data.get('api_id') or not user_data.get('api_hash'):
+            return None
+        
+        self.clients.register(phone, user_data['api_id'], user_data['api_hash'])
+        client = await self.clients.acquire(phone)
+        if not await client.is_user_authorized():
+            await self.clients.remove(phone)
+            return None
+        
+        # Building the forwarder replays its checkpoint journal, which is disk I/O
+        if phone not in self.forwarders:
+            self.forwarders[phone] = await run_io(Forwarder, None, self.storage, phone)
+        
+        # Re-read progress now that the journal has been applied
+        user_data = await self.storage.aget_user_data(phone)
+        
+        # Group interrupted runs by source; several destinations become one fan-out
+        interrupted = {}
+        for progress in user_data.get('forwarding_progress', {}).values():
+            if progress.get('status') not in RESUMABLE_STATUSES:
+                continue
+            if progress.get('source_id') not in user_data.get('sources', {}):
+                continue
+            if progress.get('destination_id') not in user_data.get('destinations', {}):
+                continue
+            interrupted.setdefault(progress['source_id'], []).append(progress['destination_id'])
+        
+        resumed = 0
+        for source_id, destination_ids in interrupted.items():
+            try:
+                if len(destination_ids) == 1:
+                    job = await run_io(self.start_forwarding, phone, source_id, destination_ids[0])
+                else:
+                    job = await run_io(self.start_fan_out, phone, source_id, destination_ids)
+            except QueueFull:
+                # The rest stay marked as running and are resumed on the next start
+                logger.warning(f"Job queue is full; not resuming the remaining jobs of {phone}")
+                break
+            except JobConflict:
+                # Already resumed, e.g. by a login racing the rehydration
+                continue
+            if job:
+                resumed += 1
+        
+        if resumed:
+            logger.info(f"Resumed {resumed} interrupted jobs for {phone}")
+        return resumed
+
     def add_source(self, phone, source_link):
         """Add a new source channel/group."""
         if phone not in self.clients:
             return {"success": False, "error": "Client not initialized"}
         
-        client = self.clients[phone]
-        
         try:
-            # Join the source channel/group
-            entity = None
-            try:
-                # Try to resolve the link as a public channel/group
-                entity = client.loop.run_until_complete(client.get_entity(source_link))
-            except:
-                # Try to resolve the link as a private channel/group
-                if 'joinchat' in source_link:
-                    # Extract the hash from the invite link
-                    invite_hash = source_link.split('/')[-1]
-                    entity = client.loop.run_until_complete(
-                        client(ImportChatInviteRequest(invite_hash))
-                    ).chats[0]
-                else:
-                    # Try to join as a public channel
-                    entity = client.loop.run_until_complete(
-                        client(JoinChannelRequest(source_link))
-                    )
+            # Resolve (or join) the source channel/group
+            entity = self.runtime.run(self._with_client(phone, lambda client: self._resolve_chat(phone, client, source_link)))
             
             # Get the entity ID and title
-            entity_id = entity.id
-            entity_title = getattr(entity, 'title', source_link)
+            entity_id = entity['id']
+            entity_title = entity['title']
             
             # Add the source to storage
             source_id = str(uuid.uuid4())
@@ -145,31 +322,13 @@ class BotManager:
         if phone not in self.clients:
             return {"success": False, "error": "Client not initialized"}
         
-        client = self.clients[phone]
-        
         try:
-            # Join the destination channel/group
-            entity = None
-            try:
-                # Try to resolve the link as a public channel/group
-                entity = client.loop.run_until_complete(client.get_entity(destination_link))
-            except:
-                # Try to resolve the link as a private channel/group
-                if 'joinchat' in destination_link:
-                    # Extract the hash from the invite link
-                    invite_hash = destination_link.split('/')[-1]
-                    entity = client.loop.run_until_complete(
-                        client(ImportChatInviteRequest(invite_hash))
-                    ).chats[0]
-                else:
-                    # Try to join as a public channel
-                    entity = client.loop.run_until_complete(
-                        client(JoinChannelRequest(destination_link))
-                    )
+            # Resolve (or join) the destination channel/group
+            entity = self.runtime.run(self._with_client(phone, lambda client: self._resolve_chat(phone, client, destination_link)))
             
             # Get the entity ID and title
-            entity_id = entity.id
-            entity_title = getattr(entity, 'title', destination_link)
+            entity_id = entity['id']
+            entity_title = entity['title']
             
             # Add the destination to storage
             destination_id = str(uuid.uuid4())
@@ -193,13 +352,141 @@ class BotManager:
             logger.error(f"Error adding destination for {phone}: {str(e)}")
             return {"success": False, "error": str(e)}
 
+    def bulk_import(self, phone, kind, links):
+        """Add many sources or destinations at once and report on every link.
+
+        ``kind`` is 'source' or 'destination'; ``links`` is a list of links
+        or text holding them.
+        """
+        if phone not in self.clients:
+            return {"success": False, "error": "Client not initialized"}
+        if kind not in ('source', 'destination'):
+            return {"success": False, "error": "Kind must be 'source' or 'destination'"}
+        
+        return self.runtime.run(self._bulk_import(phone, kind, links))
+
+    async def abulk_import(self, phone, kind, links):
+        """bulk_import for callers running on their own event loop."""
+        if phone not in self.clients:
+            return {"success": False, "error": "Client not initialized"}
+        if kind not in ('source', 'destination'):
+            return {"success": False, "error": "Kind must be 'source' or 'destination'"}
+        
+        return await asyncio.wrap_future(self.runtime.submit(self._bulk_import(phone, kind, links)))
+
+    def start_bulk_import(self, phone, kind, links):
+        """Start a bulk import in the background and return its ID at once.
+
+        An import waits on the rate limiter for every link, so it can take
+        minutes; poll get_bulk_import for its result.
+        """
+        if phone not in self.clients:
+            return {"success": False, "error": "Client not initialized"}
+        if kind not in ('source', 'destination'):
+            return {"success": False, "error": "Kind must be 'source' or 'destination'"}
+        
+        import_id = uuid.uuid4().hex[:12]
+        self.imports[import_id] = {'id': import_id, 'phone': phone, 'kind': kind, 'status': 'running',
+                                   'result': None, 'created_at': time.time(), 'finished_at': None}
+        future = self.runtime.submit(self._bulk_import(phone, kind, links))
+        future.add_done_callback(lambda f: self._on_import_done(import_id, f))
+        return {"success": True, "import_id": import_id}
+
+    def _on_import_done(self, import_id, future):
+        """Record the result of a background import and forget the oldest finished ones."""
+        if future.cancelled():
+            result = {"success": False, "error": "Import was cancelled"}
+        elif future.exception() is not None:
+            logger.error(f"Error in bulk import {import_id}: {str(future.exception())}")
+            result = {"success": False, "error": str(future.exception())}
+        else:
+            result = future.result()
+        self.imports[import_id].update(status='done', result=result, finished_at=time.time())
+        
+        finished = sorted((entry for entry in list(self.imports.values()) if entry['status'] == 'done'),
+                          key=lambda entry: entry['finished_at'])
+        for entry in finished[:-MAX_FINISHED_IMPORTS]:
+            self.imports.pop(entry['id'], None)
+
+    def get_bulk_import(self, import_id):
+        """Get a bulk import's status, with its result once done, or None."""
+        entry = self.imports.get(import_id)
+        return dict(entry) if entry else None
+
+    async def _bulk_import(self, phone, kind, links):
+        """Resolve links concurrently, then store every new chat with one write."""
+        if isinstance(links, str):
+            links = parse_links(links)
+        
+        user_data = await self.storage.aget_user_data(phone) or {}
+        existing = {item.get('link') for item in user_data.get(f"{kind}s", {}).values()}
+        semaphore = asyncio.Semaphore(IMPORT_CONCURRENCY)
+        
+        async def import_all(client):
+            async def import_link(link):
+                if link in existing:
+                    return {'link': link, 'status': 'exists'}
+                async with semaphore:
+                    return await self._import_link(phone, client, link)
+            
+            return await asyncio.gather(*(import_link(link) for link in links))
+        
+        results = await self._with_client(phone, import_all)
+        
+        # Store every resolved chat in a single batch
+        items = []
+        for result in results:
+            if result['status'] != 'added':
+                continue
+            item = {
+                'id': str(uuid.uuid4()),
+                'link': result['link'],
+                'title': result['title'],
+                'entity_id': result['entity_id']
+            }
+            if kind == 'source':
+                item['last_message_id'] = None
+            items.append(item)
+            result['id'] = item['id']
+        
+        if items:
+            add_items = self.storage.aadd_sources if kind == 'source' else self.storage.aadd_destinations
+            if not await add_items(phone, items):
+                return {"success": False, "error": "Could not save the imported chats", "results": results}
+        
+        counts = {status: sum(1 for result in results if result['status'] == status) for status in ('added', 'exists', 'failed')}
+        logger.info(f"Bulk {kind} import for {phone}: {counts['added']} added, {counts['exists']} existing, {counts['failed']} failed")
+        return {"success": True, **counts, "results": results}
+
+    async def _import_link(self, phone, client, link):
+        """Resolve (or join) one chat, waiting out FloodWaits through the shared limiter."""
+        error = None
+        for attempt in range(IMPORT_MAX_RETRIES + 1):
+            # Chats already in the entity cache need no request, so they skip the limiter
+            needs_request = await run_io(entity_cache.cached, phone, link) is None
+            if needs_request:
+                await limiter.acquire(phone)
+            
+            try:
+                entity = await self._resolve_chat(phone, client, link)
+            except FloodWaitError as e:
+                limiter.on_flood(phone, None, e.seconds)
+                error = f"Flood wait of {e.seconds}s"
+                continue
+            except Exception as e:
+                return {'link': link, 'status': 'failed', 'error': str(e)}
+            
+            if needs_request:
+                limiter.on_success(phone)
+            return {'link': link, 'status': 'added', 'title': entity['title'], 'entity_id': entity['id']}
+        
+        return {'link': link, 'status': 'failed', 'error': error}
+
     def set_last_message(self, phone, source_id, last_message_link):
         """Set the last message link for a source."""
         if phone not in self.clients:
             return {"success": False, "error": "Client not initialized"}
         
-        client = self.clients[phone]
-        
         try:
             # Extract the message ID from the link
             # Format: https://t.me/c/1234567890/123
@@ -219,8 +506,27 @@ class BotManager:
             logger.error(f"Error setting last message for {phone}: {str(e)}")
             return {"success": False, "error": str(e)}
 
-    def start_forwarding(self, phone, source_id, destination_id):
-        """Start forwarding messages from a source to a destination."""
+    def _new_job_forwarder(self, phone):
+        """Create a forwarder for one job, sharing the account's checkpointer.
+
+        The client is attached when the job starts (see _job_coro).
+        """
+        account_forwarder = self.forwarders[phone]
+        return Forwarder(None, self.storage, phone, checkpointer=account_forwarder.checkpointer)
+
+    def _job_coro(self, phone, forwarder, run):
+        """Build a job coroutine that connects the account's client and keeps it pinned while running."""
+        async def use(client):
+            forwarder.client = client
+            return await run()
+        return self._with_client(phone, use)
+
+    def start_forwarding(self, phone, source_id, destination_id, priority=0):
+        """Start forwarding messages from a source to a destination.
+
+        The job is queued on the account's scheduler and this returns the
+        job at once; it runs as soon as the account has a free slot.
+        """
         if phone not in self.clients or phone not in self.forwarders:
             logger.error(f"Client or forwarder not initialized for {phone}")
             return
@@ -242,8 +548,27 @@ class BotManager:
             source = sources[source_id]
             destination = destinations[destination_id]
             
+            # Queue the job with its own forwarder
+            forwarder = self._new_job_forwarder(phone)
+            job = self.scheduler.submit(
+                phone,
+                'forward',
+                forwarder,
+                lambda: self._job_coro(phone, forwarder, lambda: forwarder.forward_messages(
+                    source['entity_id'],
+                    destination['entity_id'],
+                    source_id,
+                    destination_id,
+                    source.get('last_message_id')
+                )),
+                priority=priority,
+                details={'source_id': source_id, 'destination_id': destination_id},
+                keys=[f"{source_id}_{destination_id}"]
+            )
+            
             # Store the active task
             self.active_tasks[phone] = {
+                'job_id': job.id,
                 'source_id': source_id,
                 'destination_id': destination_id,
                 'status': 'running',
@@ -252,28 +577,173 @@ class BotManager:
                 'last_forwarded_id': None
             }
             
-            # Start forwarding
-            self.forwarders[phone].forward_messages(
-                source['entity_id'],
-                destination['entity_id'],
-                source_id,
-                destination_id,
-                source.get('last_message_id')
-            )
+            return job
+        except (QueueFull, JobConflict):
+            # The caller reports these as backpressure or a conflict rather than a failure
+            raise
         except Exception as e:
             logger.error(f"Error starting forwarding for {phone}: {str(e)}")
             if phone in self.active_tasks:
                 self.active_tasks[phone]['status'] = 'failed'
                 self.active_tasks[phone]['error'] = str(e)
 
+    def start_fan_out(self, phone, source_id, destination_ids, priority=0):
+        """Start forwarding one source to several destinations at the same time.
+
+        The source history is read once and fanned out to every destination.
+        Like start_forwarding, this queues the job and returns it at once.
+        """
+        if phone not in self.clients or phone not in self.forwarders:
+            logger.error(f"Client or forwarder not initialized for {phone}")
+            return
+        
+        try:
+            # Get the source and destination data
+            user_data = self.storage.get_user_data(phone)
+            sources = user_data.get('sources', {})
+            destinations = user_data.get('destinations', {})
+            
+            if source_id not in sources:
+                logger.error(f"Source {source_id} not found for {phone}")
+                return
+            
+            missing = [destination_id for destination_id in destination_ids if destination_id not in destinations]
+            if missing or not destination_ids:
+                logger.error(f"Destinations {missing} not found for {phone}")
+                return
+            
+            source = sources[source_id]
+            targets = [(destinations[destination_id]['entity_id'], destination_id) for destination_id in destination_ids]
+            
+            # Queue the fan-out with its own forwarder
+            forwarder = self._new_job_forwarder(phone)
+            job = self.scheduler.submit(
+                phone,
+                'fan_out',
+                forwarder,
+                lambda: self._job_coro(phone, forwarder, lambda: forwarder.fan_out(
+                    source['entity_id'],
+                    targets,
+                    source_id,
+                    source.get('last_message_id')
+                )),
+                priority=priority,
+                details={'source_id': source_id, 'destination_ids': list(destination_ids)},
+                keys=[f"{source_id}_{destination_id}" for destination_id in destination_ids]
+            )
+            
+            # Store the active task
+            self.active_tasks[phone] = {
+                'job_id': job.id,
+                'source_id': source_id,
+                'destination_id': None,
+                'destination_ids': list(destination_ids),
+                'status': 'running',
+                'total_messages': 0,
+                'forwarded_messages': 0,
+                'last_forwarded_id': None
+            }
+            
+            return job
+        except (QueueFull, JobConflict):
+            # The caller reports these as backpressure or a conflict rather than a failure
+            raise
+        except Exception as e:
+            logger.error(f"Error starting fan-out for {phone}: {str(e)}")
+            if phone in self.active_tasks:
+                self.active_tasks[phone]['status'] = 'failed'
+                self.active_tasks[phone]['error'] = str(e)
+
+    def list_jobs(self, phone):
+        """Get every job of a user with its progress, newest first."""
+        return [job.to_dict() for job in self.scheduler.list_jobs(phone)]
+
+    def listen_progress(self, phone=None):
+        """Get a subscription to the progress events of one account, or all of them."""
+        return progress_bus.listen(phone)
+
+    def get_bot_status(self):
+        """Get whether the bot is "running" or "stopped"."""
+        return "running" if self.bot_running else "stopped"
+
+    def set_bot_running(self, running):
+        """Start or stop the bot and notify status streams."""
+        self.bot_running = bool(running)
+        self.bot_status_bus.publish({'status': self.get_bot_status()}, force=True)
+
+    def listen_bot_status(self):
+        """Get a subscription that receives an event whenever the bot is started or stopped."""
+        return self.bot_status_bus.listen()
+
+    def render_metrics(self):
+        """Get this process's metrics in the Prometheus text format."""
+        return registry.render()
+
+    def get_queue_depth(self):
+        """Get how many jobs are waiting and running across all users."""
+        return self.scheduler.queue_depth()
+
+    def get_job(self, job_id):
+        """Get one job by ID, live if it belongs to this process, else from the job store."""
+        job = self.scheduler.get_job(job_id)
+        if job:
+            return job.to_dict()
+        if self.scheduler.store is not None:
+            return self.scheduler.store.get(job_id)
+        return None
+
+    def find_jobs(self, status=None, phone=None, page=1, per_page=50):
+        """Get one page of jobs across all users from the job store, newest first."""
+        jobs, total = self.scheduler.store.list(status, phone, per_page, (page - 1) * per_page)
+        
+        # Stored counters only change with the status; running jobs have fresher ones
+        for index, stored in enumerate(jobs):
+            job = self.scheduler.get_job(stored['id'])
+            if job:
+                jobs[index] = job.to_dict()
+        
+        return {"jobs": jobs, "total": total, "page": page, "per_page": per_page}
+
+    def cancel_job(self, phone, job_id):
+        """Cancel a single queued, running or paused job; phone may be None to skip the owner check."""
+        job = self.scheduler.get_job(job_id)
+        if not job or (phone is not None and job.phone != phone):
+            return {"success": False, "error": "Job not found"}
+        
+        if not self.scheduler.cancel(job_id):
+            return {"success": False, "error": "Job has already finished"}
+        
+        return {"success": True}
+
+    def pause_job(self, job_id):
+        """Pause a running job."""
+        if not self.scheduler.get_job(job_id):
+            return {"success": False, "error": "Job not found"}
+        
+        if not self.scheduler.pause(job_id):
+            return {"success": False, "error": "Only running jobs can be paused"}
+        
+        return {"success": True}
+
+    def resume_job(self, job_id):
+        """Resume a paused job."""
+        if not self.scheduler.get_job(job_id):
+            return {"success": False, "error": "Job not found"}
+        
+        if not self.scheduler.resume(job_id):
+            return {"success": False, "error": "Only paused jobs can be resumed"}
+        
+        return {"success": True}
+
     def cancel_forwarding(self, phone):
-        """Cancel an active forwarding task."""
+        """Cancel every queued and running job of a user."""
         if phone not in self.forwarders:
             return {"success": False, "error": "Forwarder not initialized"}
         
         try:
             # Cancel the forwarding
-            self.forwarders[phone].cancel_forwarding()
+            for job in self.scheduler.active_jobs(phone):
+                self.scheduler.cancel(job.id)
             
             # Update the active task
             if phone in self.active_tasks:
@@ -294,6 +764,20 @@ class BotManager:
             }
         
         task = self.active_tasks[phone]
+        
+        # Live counters come from the job's latest progress event
+        event = self.job_progress.get(task.get('job_id'))
+        if event:
+            task['total_messages'] = event['total_messages']
+            task['forwarded_messages'] = event['forwarded_messages']
+            task['last_forwarded_id'] = event['last_forwarded_id']
+        
+        # The scheduler knows how the latest job ended
+        job = self.scheduler.get_job(task.get('job_id'))
+        if job and job.status != 'queued':
+            task['status'] = job.status
+            task['error'] = job.forwarder.progress.get('error')
+        
         progress = 0
         if task['total_messages'] > 0:
             progress = (task['forwarded_messages'] / task['total_messages']) * 100
@@ -303,12 +787,21 @@ class BotManager:
             'status': task['status'],
             'source_id': task['source_id'],
             'destination_id': task['destination_id'],
+            'destination_ids': task.get('destination_ids'),
             'total_messages': task['total_messages'],
             'forwarded_messages': task['forwarded_messages'],
             'progress': round(progress, 2),
             'error': task.get('error')
         }
 
+    def get_job_progress(self, job_id):
+        """Get the latest progress event of an unfinished job, or None."""
+        return self.job_progress.get(job_id)
+
+    def get_pool_metrics(self):
+        """Get the client pool counters."""
+        return self.clients.get_metrics()
+
     def get_active_task(self, phone):
         """Get the active task for a user."""
         return self.active_tasks.get(phone)
@@ -317,13 +810,57 @@ class BotManager:
         """Get the user data from storage."""
         return self.storage.get_user_data(phone)
 
+    async def aget_user_data(self, phone):
+        """Get the user data from storage without blocking the event loop."""
+        return await self.storage.aget_user_data(phone)
+
+    async def ainitialize_bot(self, phone, api_id, api_hash):
+        """initialize_bot for callers running on their own event loop."""
+        return await run_blocking(self.initialize_bot, phone, api_id, api_hash)
+
+    async def asubmit_code(self, phone, code):
+        """submit_code for callers running on their own event loop."""
+        return await run_blocking(self.submit_code, phone, code)
+
+    async def aadd_source(self, phone, source_link):
+        """add_source for callers running on their own event loop."""
+        return await run_blocking(self.add_source, phone, source_link)
+
+    async def aadd_destination(self, phone, destination_link):
+        """add_destination for callers running on their own event loop."""
+        return await run_blocking(self.add_destination, phone, destination_link)
+
+    async def aset_last_message(self, phone, source_id, last_message_link):
+        """set_last_message for callers running on their own event loop."""
+        return await run_blocking(self.set_last_message, phone, source_id, last_message_link)
+
+    async def astart_forwarding(self, phone, source_id, destination_id, priority=0):
+        """start_forwarding for callers running on their own event loop."""
+        return await run_blocking(self.start_forwarding, phone, source_id, destination_id, priority)
+
+    async def adelete_source(self, phone, source_id):
+        """delete_source for callers running on their own event loop."""
+        return await run_blocking(self.delete_source, phone, source_id)
+
+    async def adelete_destination(self, phone, destination_id):
+        """delete_destination for callers running on their own event loop."""
+        return await run_blocking(self.delete_destination, phone, destination_id)
+
+    async def alogout_user(self, phone):
+        """logout_user for callers running on their own event loop."""
+        return await run_blocking(self.logout_user, phone)
+
     def logout_user(self, phone):
         """Logout a user and clean up resources."""
         try:
-            # Disconnect the client
+            # Stop the user's jobs before the client goes away
+            for job in self.scheduler.active_jobs(phone):
+                self.scheduler.cancel(job.id)
+            
+            # Disconnect the client and forget it
             if phone in self.clients:
-                self.clients[phone].disconnect()
-                del self.clients[phone]
+                self.pending_logins.discard(phone)
+                self.runtime.run(self.clients.remove(phone))
             
             # Remove the forwarder
             if phone in self.forwarders:
@@ -338,6 +875,36 @@ class BotManager:
             logger.error(f"Error logging out {phone}: {str(e)}")
             return False
 
+    async def _drain_flushes(self):
+        """Wait for every background checkpoint flush; the runtime is about to stop."""
+        for forwarder in list(self.forwarders.values()):
+            await forwarder.checkpointer.adrain()
+
+    def shutdown(self):
+        """Interrupt jobs, flush buffered forwarding progress, close storage and clients, and stop the runtime.
+
+        Interrupted jobs are recorded as such and resumed by the next process.
+        """
+        self.scheduler.shutdown()
+        try:
+            self.runtime.run(self._drain_flushes(), timeout=10)
+        except Exception as e:
+            logger.error(f"Error waiting for progress flushes: {str(e)}")
+        
+        for phone, forwarder in self.forwarders.items():
+            try:
+                forwarder.checkpointer.flush()
+            except Exception as e:
+                logger.error(f"Error flushing progress for {phone}: {str(e)}")
+        
+        self.storage.close()
+        
+        try:
+            self.runtime.run(self.clients.close(), timeout=10)
+        except Exception as e:
+            logger.error(f"Error disconnecting clients: {str(e)}")
+        self.runtime.stop()
+
     def delete_source(self, phone, source_id):
         """Delete a source."""
         try:
@@ -348,7 +915,7 @@ class BotManager:
                 return {"success": False, "error": "Source not found"}
             
             # Check if the source is being used in an active task
-            if phone in self.active_tasks and self.active_tasks[phone]['source_id'] == source_id:
+            if any(job.details.get('source_id') == source_id for job in self.scheduler.active_jobs(phone)):
                 return {"success": False, "error": "Cannot delete a source that is being used in an active task"}
             
             # Delete the source
@@ -370,7 +937,10 @@ class BotManager:
                 return {"success": False, "error": "Destination not found"}
             
             # Check if the destination is being used in an active task
-            if phone in self.active_tasks and self.active_tasks[phone]['destination_id'] == destination_id:
+            if any(
+                destination_id == job.details.get('destination_id') or destination_id in job.details.get('destination_ids', [])
+                for job in self.scheduler.active_jobs(phone)
+            ):
                 return {"success": False, "error": "Cannot delete a destination that is being used in an active task"}
             
             # Delete the destination
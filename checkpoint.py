@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from runtime import run_io
+from metrics import CHECKPOINT_LATENCY
+
+logger = logging.getLogger(__name__)
+
+# Flush buffered progress to storage after this many updates or seconds
+CHECKPOINT_EVERY = int(os.environ.get("CHECKPOINT_EVERY", 50))
+CHECKPOINT_INTERVAL = float(os.environ.get("CHECKPOINT_INTERVAL", 10))
+
+
+class Journal:
+    """An append-only file of JSON records, one per line."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def append(self, record):
+        """Append a record and hand it to the OS."""
+        if self.file is None:
+            self.file = open(self.path, 'a')
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+
+    def sync(self):
+        """Force appended records to disk."""
+        if self.file is not None:
+            os.fsync(self.file.fileno())
+
+    def read(self):
+        """Read every complete record, skipping a torn last line."""
+        if not os.path.exists(self.path):
+            return []
+
+        records = []
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    logger.warning(f"Skipping damaged journal record in {self.path}")
+        return records
+
+    def truncate(self):
+        """Drop every record, once they are safely stored elsewhere."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class ProgressCheckpointer:
+    """Keep forwarding progress in memory and write it to storage in batches.
+
+    Every update lands in memory. Commit points (the end of a forwarded
+    batch) are also appended to a small journal, so a crash between two
+    flushes loses at most the batch in flight. Buffered progress is written
+    to storage every CHECKPOINT_EVERY updates or CHECKPOINT_INTERVAL seconds,
+    and whenever flush() is called explicitly.
+    """
+
+    def __init__(self, storage, phone, every=CHECKPOINT_EVERY, interval=CHECKPOINT_INTERVAL):
+        self.storage = storage
+        self.phone = phone
+        self.every = every
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()  # Keeps flushes in order
+        self.flush_tasks = set()  # Background flushes started from event loops
+        self.journaled = 0  # Commit points appended to the journal so far
+        self.pending = {}  # Maps task keys to their latest unflushed progress
+        self.updates = 0
+        self.last_flush = time.monotonic()
+        self.journal = Journal(os.path.join(storage.data_dir, f"{phone}.progress.journal"))
+
+    def record(self, key, progress, commit=False):
+        """Buffer the progress of a task, journaling it at commit points."""
+        with self.lock:
+            self.pending[key] = progress
+            self.updates += 1
+            if commit:
+                self.journal.append({'key': key, 'progress': progress})
+                self.journaled += 1
+
+            due = self.updates >= self.every or time.monotonic() - self.last_flush >= self.interval
+
+        if due:
+            # Off the event loop when called from one
+            self.flush_soon()
+
+    def get(self, key):
+        """Get the buffered progress of a task, or None if nothing is pending."""
+        with self.lock:
+            progress = self.pending.get(key)
+            return progress.copy() if progress else None
+
+    def flush(self):
+        """Write buffered progress to storage and clear the journal.
+
+        The storage write happens outside the record lock, so an event loop
+        recording progress never waits for disk I/O.
+        """
+        with self.flush_lock:
+            with self.lock:
+                pending, self.pending = self.pending, {}
+                journaled = self.journaled
+                self.updates = 0
+                self.last_flush = time.monotonic()
+            
+            if not pending:
+                return
+            
+            with CHECKPOINT_LATENCY.time(backend=type(self.storage).__name__):
+                stored = self.storage.update_progress(self.phone, pending)
+            
+            with self.lock:
+                if not stored:
+                    # Keep the progress for the next flush unless something newer arrived
+                    for key, progress in pending.items():
+                        self.pending.setdefault(key, progress)
+                elif self.journaled == journaled:
+                    # Records journaled meanwhile must survive until they are flushed too
+                    self.journal.truncate()
+    
+    async def aflush(self):
+        """Flush on the storage I/O executor instead of the calling event loop."""
+        await run_io(self.flush)
+    
+    def flush_soon(self):
+        """Flush in the background when called on an event loop, otherwise right away."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        
+        task = loop.create_task(self.aflush())
+        self.flush_tasks.add(task)
+        task.add_done_callback(self.flush_tasks.discard)
+
+    async def adrain(self):
+        """Wait for the background flushes started by flush_soon."""
+        if self.flush_tasks:
+            await asyncio.gather(*list(self.flush_tasks), return_exceptions=True)
+
+    def recover(self):
+        """Replay a journal left behind by a crash into storage."""
+        with self.lock:
+            records = self.journal.read()
+            if not records:
+                return
+
+            # Later records win over earlier ones for the same task
+            progress = {}
+            for record in records:
+                progress[record['key']] = record['progress']
+
+            if self.storage.update_progress(self.phone, progress):
+                self.journal.truncate()
+                logger.info(f"Recovered {len(progress)} progress checkpoints for {self.phone}")
@@ -0,0 +1,155 @@
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from telethon import TelegramClient
+
+logger = logging.getLogger(__name__)
+
+# Most clients kept connected at once, and how long an unused one stays connected
+MAX_CONNECTED_CLIENTS = int(os.environ.get("MAX_CONNECTED_CLIENTS", 50))
+CLIENT_IDLE_TIMEOUT = float(os.environ.get("CLIENT_IDLE_TIMEOUT", 600))
+
+
+class ClientPool:
+    """Telegram clients of every logged-in account, connected only while in use.
+
+    Accounts are registered with their credentials; a client is created and
+    connected on first use, and disconnected (and dropped) once it has been
+    idle for CLIENT_IDLE_TIMEOUT seconds or when the pool is over
+    MAX_CONNECTED_CLIENTS, least recently used first. The .session files
+    stay on disk, so reconnecting needs no login. Pinned clients (running
+    jobs, logins waiting for a code) are never disconnected.
+
+    All coroutines must run on the forwarding runtime loop.
+    """
+
+    def __init__(self, max_connected=MAX_CONNECTED_CLIENTS, idle_timeout=CLIENT_IDLE_TIMEOUT, session_dir='sessions'):
+        self.max_connected = max_connected
+        self.idle_timeout = idle_timeout
+        self.session_dir = session_dir
+        self.credentials = {}  # Maps phone numbers to (api_id, api_hash)
+        self.connected = OrderedDict()  # Maps phone numbers to clients, least recently used first
+        self.last_used = {}
+        self.pins = {}  # Maps phone numbers to how many users hold the client
+        self.locks = {}
+        self.reaper = None
+        self.stats = {'hits': 0, 'connects': 0, 'evictions': 0, 'idle_disconnects': 0}
+
+    def __contains__(self, phone):
+        return phone in self.credentials
+
+    def register(self, phone, api_id, api_hash):
+        """Remember an account's credentials so its client can be connected on demand."""
+        self.credentials[phone] = (api_id, api_hash)
+
+    async def acquire(self, phone):
+        """Get a connected client for an account, connecting it if needed."""
+        if phone not in self.credentials:
+            raise KeyError(f"No client registered for {phone}")
+
+        self._start_reaper()
+        lock = self.locks.setdefault(phone, asyncio.Lock())
+        async with lock:
+            client = self.connected.get(phone)
+            if client is not None and client.is_connected():
+                self.stats['hits'] += 1
+            else:
+                api_id, api_hash = self.credentials[phone]
+                client = TelegramClient(os.path.join(self.session_dir, phone), api_id, api_hash)
+                await client.connect()
+                self.connected[phone] = client
+                self.stats['connects'] += 1
+
+            self.connected.move_to_end(phone)
+            self.last_used[phone] = time.monotonic()
+
+        await self._evict_over_cap()
+        return client
+
+    def pin(self, phone):
+        """Keep an account's client connected until unpin() is called."""
+        self.pins[phone] = self.pins.get(phone, 0) + 1
+
+    def unpin(self, phone):
+        if self.pins.get(phone, 0) <= 1:
+            self.pins.pop(phone, None)
+            self.last_used[phone] = time.monotonic()
+        else:
+            self.pins[phone] -= 1
+
+    async def disconnect(self, phone):
+        """Disconnect and drop an account's client; the next acquire() reconnects it."""
+        client = self.connected.pop(phone, None)
+        self.last_used.pop(phone, None)
+        if client is not None:
+            try:
+                await client.disconnect()
+            except Exception as e:
+                logger.error(f"Error disconnecting client for {phone}: {str(e)}")
+
+    async def remove(self, phone):
+        """Disconnect an account and forget its credentials, e.g. on logout."""
+        self.credentials.pop(phone, None)
+        self.pins.pop(phone, None)
+        self.locks.pop(phone, None)
+        await self.disconnect(phone)
+
+    async def _evict_over_cap(self):
+        """Disconnect the least recently used unpinned clients while over the cap."""
+        over = len(self.connected) - self.max_connected
+        if over <= 0:
+            return
+
+        victims = [phone for phone in self.connected if phone not in self.pins][:over]
+        if len(victims) < over:
+            logger.warning(f"Client pool is over its cap of {self.max_connected}; every other client is pinned")
+
+        for phone in victims:
+            logger.info(f"Evicting least recently used client for {phone}")
+            self.stats['evictions'] += 1
+            await self.disconnect(phone)
+
+    async def evict_idle(self):
+        """Disconnect unpinned clients that have not been used for idle_timeout seconds."""
+        now = time.monotonic()
+        idle = [
+            phone for phone in self.connected
+            if phone not in self.pins and now - self.last_used.get(phone, 0) >= self.idle_timeout
+        ]
+        for phone in idle:
+            logger.info(f"Disconnecting idle client for {phone}")
+            self.stats['idle_disconnects'] += 1
+            await self.disconnect(phone)
+
+    def _start_reaper(self):
+        """Start the idle check on the running loop once."""
+        if self.reaper is None or self.reaper.done():
+            self.reaper = asyncio.get_running_loop().create_task(self._reap())
+
+    async def _reap(self):
+        while True:
+            await asyncio.sleep(min(self.idle_timeout / 2, 60))
+            try:
+                await self.evict_idle()
+            except Exception as e:
+                logger.error(f"Error evicting idle clients: {str(e)}")
+
+    async def close(self):
+        """Disconnect every client."""
+        if self.reaper is not None:
+            self.reaper.cancel()
+        for phone in list(self.connected):
+            await self.disconnect(phone)
+
+    def get_metrics(self):
+        """Get pool counters for monitoring."""
+        return {
+            'registered': len(self.credentials),
+            'connected': len(self.connected),
+            'pinned': len(self.pins),
+            'max_connected': self.max_connected,
+            'idle_timeout': self.idle_timeout,
+            **self.stats
+        }
@@ -0,0 +1,50 @@
+import os
+import signal
+import logging
+import threading
+from bot_manager import BotManager
+from rpc import RPCServer, DEFAULT_SOCKET
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                    handlers=[logging.StreamHandler()])
+
+logger = logging.getLogger(__name__)
+
+FORWARDER_SOCKET = os.environ.get("FORWARDER_SOCKET") or DEFAULT_SOCKET
+
+
+def main():
+    """Own every Telegram client and job, and serve web workers over a Unix socket."""
+    bot_manager = BotManager()
+
+    # Reconnect saved sessions and resume interrupted jobs without waiting for logins
+    if os.environ.get("REHYDRATE_SESSIONS", "true").lower() == "true":
+        bot_manager.rehydrate()
+
+    server = RPCServer(FORWARDER_SOCKET, bot_manager)
+
+    def stop(signum, frame):
+        logger.info(f"Received signal {signum}, shutting down")
+        # shutdown() waits for serve_forever, so it cannot run on this thread
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    logger.info(f"Forwarding daemon listening on {FORWARDER_SOCKET}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(FORWARDER_SOCKET):
+            os.remove(FORWARDER_SOCKET)
+
+        # Make sure buffered forwarding progress reaches storage
+        bot_manager.shutdown()
+        logger.info("Forwarding daemon stopped")
+
+
+if __name__ == "__main__":
+    main()
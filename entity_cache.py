@@ -0,0 +1,188 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from telethon.tl.types import Channel, Chat, User, InputPeerChannel, InputPeerChat, InputPeerUser
+from runtime import run_io
+
+logger = logging.getLogger(__name__)
+
+# How long a cached entity is trusted before it is refreshed from Telegram
+ENTITY_CACHE_TTL = float(os.environ.get("ENTITY_CACHE_TTL", 7 * 24 * 3600))
+
+
+def cache_keys(target):
+    """Get the cache keys a link, username or ID is stored under."""
+    if isinstance(target, int) or (isinstance(target, str) and target.lstrip('-').isdigit()):
+        return [f"id:{int(target)}"]
+
+    link = str(target).strip().rstrip('/')
+    for prefix in ('https://', 'http://'):
+        if link.startswith(prefix):
+            link = link[len(prefix):]
+    for prefix in ('t.me/', 'telegram.me/'):
+        if link.startswith(prefix):
+            link = link[len(prefix):]
+
+    # Invite links only identify a chat once it has been joined through them
+    if link.startswith('joinchat/'):
+        return [f"invite:{link[len('joinchat/'):]}"]
+    if link.startswith('+'):
+        return [f"invite:{link[1:]}"]
+
+    return [f"username:{link.lstrip('@').lower()}"]
+
+
+def input_peer(entry):
+    """Build the input peer for a cached entity, so no resolve call is needed."""
+    if entry['type'] == 'channel':
+        return InputPeerChannel(entry['id'], entry['access_hash'])
+    if entry['type'] == 'chat':
+        return InputPeerChat(entry['id'])
+    return InputPeerUser(entry['id'], entry['access_hash'])
+
+
+class EntityCache:
+    """Persistent cache of resolved chats, per account.
+
+    Maps links, usernames and IDs to (id, access_hash, type, title) in a
+    SQLite table, so a chat resolved once (say by add_source) never costs a
+    ResolveUsername call again. Access hashes belong to the account that
+    resolved them, so every entry is keyed by phone as well.
+    """
+
+    def __init__(self, data_dir='data', ttl=ENTITY_CACHE_TTL):
+        self.db_path = os.path.join(data_dir, 'entities.db')
+        self.ttl = ttl
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.memory = {}  # Maps (phone, key) to entries already read from disk
+
+    def _connect(self):
+        """Get this thread's connection, creating the table on first use."""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            with conn:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS entities (
+                        phone TEXT NOT NULL,
+                        key TEXT NOT NULL,
+                        peer_id INTEGER NOT NULL,
+                        access_hash INTEGER,
+                        type TEXT NOT NULL,
+                        title TEXT,
+                        updated_at REAL NOT NULL,
+                        PRIMARY KEY (phone, key)
+                    )
+                ''')
+            self.local.conn = conn
+        return conn
+
+    def lookup(self, phone, target):
+        """Get the cached entry for a link, username or ID, or None."""
+        for key in cache_keys(target):
+            with self.lock:
+                entry = self.memory.get((phone, key))
+            if entry is not None:
+                return entry
+
+            row = self._connect().execute(
+                'SELECT peer_id, access_hash, type, title, updated_at FROM entities WHERE phone = ? AND key = ?',
+                (phone, key)
+            ).fetchone()
+            if row is not None:
+                entry = {'id': row[0], 'access_hash': row[1], 'type': row[2], 'title': row[3], 'updated_at': row[4]}
+                with self.lock:
+                    self.memory[(phone, key)] = entry
+                return entry
+
+        return None
+
+    def cached(self, phone, target):
+        """Get the entry for a target if it is cached and fresh, or None if resolving it needs a request."""
+        entry = self.lookup(phone, target)
+        if entry is not None and time.time() - entry['updated_at'] < self.ttl:
+            return entry
+        return None
+
+    def store(self, phone, target, entity):
+        """Remember an entity under the target it was resolved from and its ID."""
+        if isinstance(entity, Channel):
+            kind = 'channel'
+        elif isinstance(entity, Chat):
+            kind = 'chat'
+        elif isinstance(entity, User):
+            kind = 'user'
+        else:
+            raise ValueError(f"Cannot cache entity of type {type(entity).__name__}")
+
+        entry = {
+            'id': entity.id,
+            'access_hash': getattr(entity, 'access_hash', None),
+            'type': kind,
+            'title': getattr(entity, 'title', None) or getattr(entity, 'first_name', None) or str(target),
+            'updated_at': time.time()
+        }
+
+        keys = set(cache_keys(target)) | set(cache_keys(entity.id))
+        if getattr(entity, 'username', None):
+            keys.update(cache_keys(entity.username))
+
+        conn = self._connect()
+        with conn:
+            conn.executemany('''
+                INSERT INTO entities (phone, key, peer_id, access_hash, type, title, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (phone, key) DO UPDATE SET
+                    peer_id = excluded.peer_id,
+                    access_hash = excluded.access_hash,
+                    type = excluded.type,
+                    title = excluded.title,
+                    updated_at = excluded.updated_at
+            ''', [(phone, key, entry['id'], entry['access_hash'], kind, entry['title'], entry['updated_at']) for key in keys])
+
+        with self.lock:
+            for key in keys:
+                self.memory[(phone, key)] = entry
+        return entry
+
+    def forget(self, phone):
+        """Drop every cached entity of an account."""
+        with self.lock:
+            self.memory = {key: entry for key, entry in self.memory.items() if key[0] != phone}
+
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM entities WHERE phone = ?', (phone,))
+
+    async def resolve(self, client, phone, target):
+        """Get the cache entry for a target, asking Telegram only when it is unknown or stale.
+
+        Stale entries are refreshed through their input peer, which never
+        needs ResolveUsername; if the refresh fails the stale entry is used.
+        """
+        entry = await run_io(self.lookup, phone, target)
+        if entry is not None and time.time() - entry['updated_at'] < self.ttl:
+            return entry
+
+        try:
+            entity = await client.get_entity(input_peer(entry) if entry else target)
+        except Exception as e:
+            if entry is None:
+                raise
+            logger.warning(f"Could not refresh cached entity {target} for {phone}: {str(e)}")
+            return entry
+
+        return await run_io(self.store, phone, target, entity)
+
+    async def get_input_entity(self, client, phone, target):
+        """Get an input peer usable in any request, resolving only on a cache miss."""
+        return input_peer(await self.resolve(client, phone, target))
+
+
+# The cache shared by BotManager and every Forwarder in this process
+entity_cache = EntityCache()
@@ -1,19 +1,100 @@
+import os
 import time
 import logging
 import asyncio
 import threading
-from telethon import errors
+from telethon import errors, utils
 from datetime import datetime
+from rate_limiter import limiter
+from checkpoint import ProgressCheckpointer
+from entity_cache import entity_cache
+from progress_bus import progress_bus
+from metrics import MESSAGES_FETCHED, MESSAGES_FORWARDED, API_LATENCY
 
 logger = logging.getLogger(__name__)
 
+# Telegram accepts at most 100 message IDs per forward request
+MAX_BATCH_SIZE = 100
+MIN_BATCH_SIZE = 5
+INITIAL_BATCH_SIZE = 20
+BATCH_GROWTH_STEP = 10
+
+# How many messages a fan-out destination may fall behind the shared reader
+# before it is detached and left to catch up on its own
+FANOUT_QUEUE_SIZE = 500
+
+# Pages of history fetched ahead of the sender, and the cap on messages held
+PREFETCH_PAGES = int(os.environ.get("PREFETCH_PAGES", 3))
+PREFETCH_MAX_MESSAGES = int(os.environ.get("PREFETCH_MAX_MESSAGES", 1000))
+
+# How often a paused job checks whether it was resumed or cancelled, in seconds
+PAUSE_POLL_INTERVAL = 1
+
+
+def split_units(messages):
+    """Split a list of messages into forwarding units, keeping albums whole."""
+    units = []
+    for message in messages:
+        grouped_id = getattr(message, 'grouped_id', None)
+        if grouped_id and units and units[-1][0].grouped_id == grouped_id:
+            units[-1].append(message)
+        else:
+            units.append([message])
+    return units
+
+
+class FanOutTarget:
+    """One destination of a fan-out job, with its own queue and checkpoint."""
+
+    def __init__(self, forwarder, destination_id, entity, start_msg_id):
+        self.forwarder = forwarder
+        self.destination_id = destination_id
+        self.entity = entity
+        self.start_msg_id = start_msg_id
+        self.queue = asyncio.Queue(maxsize=FANOUT_QUEUE_SIZE)
+        self.lag_from = None  # First message ID this target stopped receiving from the reader
+        self.ended = False  # Set by the reader once it has handed over every message
+        self.worker = None  # Task forwarding this target's queue
+        self.key = f"{forwarder.progress['source_id']}_{destination_id}"
+        self.progress = {
+            'source_id': forwarder.progress['source_id'],
+            'destination_id': destination_id,
+            'total_messages': 0,
+            'forwarded_messages': 0,
+            'last_forwarded_id': None,
+            'status': 'running',
+            'error': None
+        }
+
+    def record_forwarded(self, count, last_id):
+        """Checkpoint this destination and add to the job-wide count."""
+        self.progress['forwarded_messages'] += count
+        self.progress['total_messages'] = max(self.progress['total_messages'], self.progress['forwarded_messages'])
+        self.progress['last_forwarded_id'] = last_id
+        self.checkpoint(commit=True)
+        
+        # The job-wide count is the sum over all destinations
+        job = self.forwarder.progress
+        self.forwarder.update_progress(
+            forwarded_messages=job['forwarded_messages'] + count,
+            total_messages=max(job['total_messages'], job['forwarded_messages'] + count)
+        )
+
+    def checkpoint(self, commit=False, **changes):
+        self.progress.update(changes)
+        self.forwarder.checkpointer.record(self.key, self.progress.copy(), commit=commit)
+
+
 class Forwarder:
-    def __init__(self, client, storage, phone):
+    def __init__(self, client, storage, phone, checkpointer=None):
         self.client = client
         self.storage = storage
         self.phone = phone
+        self.job_id = None  # Set by the scheduler; tags progress events
         self.is_running = False
         self.should_cancel = False
+        self.interrupted = False  # Stopped by a shutdown, to be resumed by the next process
+        self.paused = False
         self.lock = threading.Lock()
         self.progress = {
             'source_id': None,
@@ -24,26 +105,47 @@ class Forwarder:
             'status': 'idle',
             'error': None
         }
+        
+        # Jobs of the same account share one checkpointer and journal
+        if checkpointer is None:
+            checkpointer = ProgressCheckpointer(storage, phone)
+            
+            # Apply any checkpoints a previous crash left in the journal
+            checkpointer.recover()
+        self.checkpointer = checkpointer
 
     def update_progress(self, **kwargs):
-        """Update the progress data with thread safety."""
+        """Update the progress data with thread safety.
+
+        Progress is buffered by the checkpointer; status changes are flushed
+        to storage straight away (off the event loop when called from one)
+        and new checkpoints are journaled. Every update is also offered to
+        the progress bus, which rate-limits all but status changes.
+        """
         with self.lock:
             for key, value in kwargs.items():
                 self.progress[key] = value
             
-            # Update the progress in the storage
-            user_data = self.storage.get_user_data(self.phone)
-            forwarding_progress = user_data.get('forwarding_progress', {})
-            
-            if self.progress['source_id'] and self.progress['destination_id']:
-                key = f"{self.progress['source_id']}_{self.progress['destination_id']}"
-                forwarding_progress[key] = self.progress.copy()
-                
-                # Update the storage
-                self.storage.update_user(self.phone, {'forwarding_progress': forwarding_progress})
+            progress = self.progress.copy()
+        
+        progress_bus.publish(dict(progress, phone=self.phone, job_id=self.job_id, timestamp=time.time()), force='status' in kwargs)
+        
+        if not (progress['source_id'] and progress['destination_id']):
+            return
+        
+        key = f"{progress['source_id']}_{progress['destination_id']}"
+        
+        self.checkpointer.record(key, progress, commit='last_forwarded_id' in kwargs)
+        if 'status' in kwargs:
+            self.checkpointer.flush_soon()
 
-    def forward_messages(self, source_entity_id, destination_entity_id, source_id, destination_id, last_message_id=None):
-        """Forward messages from source to destination."""
+    async def forward_messages(self, source_entity_id, destination_entity_id, source_id, destination_id, last_message_id=None, batched=True):
+        """Forward messages from source to destination.
+
+        This is a coroutine meant to run on the shared forwarding runtime.
+        With ``batched`` set, message IDs are forwarded in chunks of up to
+        100 per request instead of one request per message.
+        """
         # Check if already running
         if self.is_running:
             logger.warning(f"Forwarder already running for {self.phone}")
@@ -52,160 +154,535 @@ class Forwarder:
         self.is_running = True
         self.should_cancel = False
         
-        # Initialize progress
+        # Read the checkpoint before the new run overwrites it
+        start_msg_id, prev_progress = await self._resume_point(source_id, destination_id)
+        
+        # Initialize progress, carrying the counts of a resumed run
         self.update_progress(
             source_id=source_id,
             destination_id=destination_id,
-            total_messages=0,
-            forwarded_messages=0,
-            last_forwarded_id=None,
+            total_messages=prev_progress.get('total_messages', 0),
+            forwarded_messages=prev_progress.get('forwarded_messages', 0),
+            last_forwarded_id=prev_progress.get('last_forwarded_id'),
             status='running',
             error=None
         )
         
         try:
-            # Get previous progress if available
-            user_data = self.storage.get_user_data(self.phone)
-            forwarding_progress = user_data.get('forwarding_progress', {})
-            key = f"{source_id}_{destination_id}"
-            
-            prev_progress = forwarding_progress.get(key, {})
-            last_forwarded_id = prev_progress.get('last_forwarded_id')
-            
-            # If we're resuming and have a last forwarded ID, use that
-            if last_forwarded_id and prev_progress.get('status') != 'completed':
-                start_msg_id = last_forwarded_id + 1
-            else:
-                # Otherwise start from the beginning (or the specified last message)
-                start_msg_id = 1
-            
             logger.info(f"Starting forwarding from {source_entity_id} to {destination_entity_id} for {self.phone}")
             logger.info(f"Starting from message ID: {start_msg_id}")
             
-            # Run the forwarding in the event loop
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            try:
-                loop.run_until_complete(self._forward_messages_async(
-                    source_entity_id, 
-                    destination_entity_id, 
-                    start_msg_id, 
-                    last_message_id
-                ))
-            finally:
-                loop.close()
+            await self._forward_messages_async(
+                source_entity_id, 
+                destination_entity_id, 
+                start_msg_id, 
+                last_message_id,
+                batched
+            )
                 
             if self.should_cancel:
-                self.update_progress(status='cancelled')
-                logger.info(f"Forwarding cancelled for {self.phone}")
+                self.update_progress(status=self.stopped_status())
+                logger.info(f"Forwarding {self.stopped_status()} for {self.phone}")
             else:
                 self.update_progress(status='completed')
                 logger.info(f"Forwarding completed for {self.phone}")
+        except asyncio.CancelledError:
+            # The task handle was cancelled from outside
+            self.update_progress(status=self.stopped_status())
+            logger.info(f"Forwarding task {self.stopped_status()} for {self.phone}")
+            raise
         except Exception as e:
-            logger.error(f"Error in forward_messages for {self.phone}: {str(e)}")
-            self.update_progress(status='failed', error=str(e))
+            if self.interrupted:
+                # Clients are disconnected during a shutdown; the run is resumed later
+                self.update_progress(status='interrupted')
+            else:
+                logger.error(f"Error in forward_messages for {self.phone}: {str(e)}")
+                self.update_progress(status='failed', error=str(e))
         finally:
+            await self.checkpointer.aflush()
             self.is_running = False
 
-    async def _forward_messages_async(self, source_entity_id, destination_entity_id, start_msg_id, last_message_id=None):
-        """Async implementation of message forwarding."""
+    async def _resume_point(self, source_id, destination_id):
+        """Get the message ID a source/destination pair should start from.
+
+        History is forwarded oldest-first, so every message up to the
+        checkpointed ``last_forwarded_id`` is done and the run continues
+        right after it. Returns the start ID and the progress to resume
+        (empty when starting over).
+        """
+        key = f"{source_id}_{destination_id}"
+        
+        # Unflushed progress in memory is newer than what storage holds
+        prev_progress = self.checkpointer.get(key)
+        if prev_progress is None:
+            user_data = await self.storage.aget_user_data(self.phone) or {}
+            prev_progress = user_data.get('forwarding_progress', {}).get(key, {})
+        
+        last_forwarded_id = prev_progress.get('last_forwarded_id')
+        
+        # If we're resuming and have a last forwarded ID, use that
+        if last_forwarded_id and prev_progress.get('status') != 'completed':
+            return last_forwarded_id + 1, prev_progress
+        
+        # Otherwise start from the beginning (or the specified last message)
+        return 1, {}
+
+    async def fan_out(self, source_entity_id, destinations, source_id, last_message_id=None):
+        """Read a source once and forward it to several destinations at the same time.
+
+        ``destinations`` is a list of ``(destination_entity_id, destination_id)``
+        pairs. A single history reader feeds a bounded queue per destination.
+        Each destination forwards at its own pace under its own rate limit and
+        checkpoint. A destination whose queue fills up is detached from the
+        reader so it does not hold the others back, and catches up with its
+        own reader once its queue is drained.
+        """
+        if self.is_running:
+            logger.warning(f"Forwarder already running for {self.phone}")
+            return
+        
+        self.is_running = True
+        self.should_cancel = False
+        
+        # Job-wide progress; each destination checkpoints under its own key
+        self.update_progress(
+            source_id=source_id,
+            destination_id=None,
+            total_messages=0,
+            forwarded_messages=0,
+            last_forwarded_id=None,
+            status='running',
+            error=None
+        )
+        
+        targets = []
         try:
-            # Get the source entity
-            source_entity = await self.client.get_entity(source_entity_id)
-            
-            # Get the destination entity
-            destination_entity = await self.client.get_entity(destination_entity_id)
-            
-            # Get messages from the source
-            messages = []
-            offset_id = 0
-            limit = 100
-            total_messages = 0
+            source_entity = await self._get_entity(source_entity_id)
+            for destination_entity_id, destination_id in destinations:
+                entity = await self._get_entity(destination_entity_id)
+                start_msg_id, prev_progress = await self._resume_point(source_id, destination_id)
+                target = FanOutTarget(self, destination_id, entity, start_msg_id)
+                target.progress['forwarded_messages'] = prev_progress.get('forwarded_messages', 0)
+                target.progress['last_forwarded_id'] = prev_progress.get('last_forwarded_id')
+                targets.append(target)
             
-            # If last_message_id is specified, we need to get all messages up to that ID
             end_msg_id = last_message_id if last_message_id else 0
+            start_msg_id = min(target.start_msg_id for target in targets)
             
-            # First, count the total number of messages to forward
-            while True:
-                history = await self.client.get_messages(
-                    source_entity,
-                    limit=limit,
-                    offset_id=offset_id,
-                    min_id=start_msg_id - 1,  # -1 because we want to include start_msg_id
-                    max_id=end_msg_id if end_msg_id > 0 else None
-                )
-                
-                if not history:
-                    break
-                
-                total_messages += len(history)
-                offset_id = history[-1].id
-                
-                if len(history) < limit:
-                    break
+            logger.info(f"Starting fan-out from {source_entity_id} to {len(targets)} destinations for {self.phone}")
             
-            # Update the total count
-            self.update_progress(total_messages=total_messages)
+            for target in targets:
+                target.worker = asyncio.create_task(self._fan_out_worker(target, source_entity, end_msg_id))
+            workers = [target.worker for target in targets]
+            try:
+                await self._fan_out_reader(source_entity, targets, start_msg_id, end_msg_id)
+                outcomes = await asyncio.gather(*workers, return_exceptions=True)
+            finally:
+                for worker in workers:
+                    worker.cancel()
             
-            # Reset for actual forwarding
-            offset_id = 0
-            forwarded_count = 0
+            # A failed destination does not fail the others
+            failed = [(target, outcome) for target, outcome in zip(targets, outcomes) if isinstance(outcome, Exception)]
+            if failed and len(failed) == len(targets):
+                raise failed[0][1]
+            for target, error in failed:
+                logger.error(f"Destination {target.destination_id} of fan-out for {self.phone} failed: {str(error)}")
+                target.checkpoint(status='failed', error=str(error))
             
-            while True:
+            status = self.stopped_status() if self.should_cancel else 'completed'
+            failed_targets = [target for target, _ in failed]
+            for target in targets:
+                if target not in failed_targets:
+                    target.checkpoint(status=status)
+            self.update_progress(status=status, error=f"{len(failed)} of {len(targets)} destinations failed" if failed else None)
+            logger.info(f"Fan-out {status} for {self.phone}")
+        except asyncio.CancelledError:
+            for target in targets:
+                target.checkpoint(status=self.stopped_status())
+            self.update_progress(status=self.stopped_status())
+            logger.info(f"Fan-out task {self.stopped_status()} for {self.phone}")
+            raise
+        except Exception as e:
+            if self.interrupted:
+                # Clients are disconnected during a shutdown; the run is resumed later
+                for target in targets:
+                    target.checkpoint(status='interrupted')
+                self.update_progress(status='interrupted')
+            else:
+                logger.error(f"Error in fan_out for {self.phone}: {str(e)}")
+                for target in targets:
+                    target.checkpoint(status='failed', error=str(e))
+                self.update_progress(status='failed', error=str(e))
+        finally:
+            await self.checkpointer.aflush()
+            self.is_running = False
+
+    async def _fan_out_reader(self, source_entity, targets, start_msg_id, end_msg_id):
+        """Read the source history once and hand every message to each destination."""
+        def on_total(total):
+            # Every destination receives the whole source
+            for target in targets:
+                target.progress['total_messages'] = total
+            self.update_progress(total_messages=total * len(targets))
+        
+        messages = self._iter_history(source_entity, start_msg_id, end_msg_id, on_total=on_total)
+        try:
+            async for message in messages:
+                await self._wait_while_paused()
                 if self.should_cancel:
                     break
                 
+                for target in targets:
+                    if target.lag_from is not None or target.worker.done() or message.id < target.start_msg_id:
+                        continue
+                    try:
+                        target.queue.put_nowait(message)
+                    except asyncio.QueueFull:
+                        # Too slow to keep up; it will read the rest itself
+                        target.lag_from = message.id
+                        logger.info(f"Destination {target.destination_id} fell behind at message {message.id}")
+        finally:
+            await messages.aclose()
+        
+        # Tell the attached destinations that the stream has ended. Never wait
+        # on a full queue: its worker may have died; a live one sees the flag
+        # once it has drained the queue.
+        for target in targets:
+            target.ended = True
+            if target.lag_from is None and not target.worker.done():
+                try:
+                    target.queue.put_nowait(None)
+                except asyncio.QueueFull:
+                    pass
+
+    async def _fan_out_worker(self, target, source_entity, end_msg_id):
+        """Forward one destination's queue, then catch up on its own if it fell behind."""
+        async def from_queue():
+            while True:
+                if (target.lag_from is not None or target.ended) and target.queue.empty():
+                    return
+                message = await target.queue.get()
+                if message is None:
+                    return
+                yield message
+        
+        await self._forward_batched(from_queue(), source_entity, target.entity, target.record_forwarded)
+        
+        if target.lag_from is not None and not self.should_cancel:
+            # History is read oldest-first, so the rest starts at the lag point
+            catch_up = self._iter_history(source_entity, target.lag_from, end_msg_id, on_total=lambda total: None)
+            await self._forward_batched(catch_up, source_entity, target.entity, target.record_forwarded)
+
+    async def _iter_pages(self, source_entity, start_msg_id, end_msg_id=0, limit=100, on_total=None):
+        """Fetch the source history oldest-first, one page per request.
+
+        The first request seeks straight to ``start_msg_id``; each following
+        page continues after the last ID of the previous one. The total is
+        taken from the ``.total`` of the first page, so no separate counting
+        pass over the history is needed. It is passed to ``on_total``, which
+        defaults to storing it in the progress.
+        """
+        on_total = on_total or (lambda total: self.update_progress(total_messages=total))
+        # With reverse=True, offset_id is an exclusive lower bound
+        offset_id = start_msg_id - 1
+        total_known = False
+        
+        while True:
+            with API_LATENCY.time(method='get_messages'):
                 history = await self.client.get_messages(
                     source_entity,
                     limit=limit,
                     offset_id=offset_id,
-                    min_id=start_msg_id - 1,  # -1 because we want to include start_msg_id
-                    max_id=end_msg_id if end_msg_id > 0 else None
+                    reverse=True,
+                    max_id=end_msg_id + 1 if end_msg_id > 0 else 0  # +1 because we want to include end_msg_id
                 )
-                
-                if not history:
+            
+            if not history:
+                break
+            
+            MESSAGES_FETCHED.inc(len(history), account=self.phone)
+            
+            if not total_known:
+                # `total` counts the whole chat, so clamp it to the IDs up to the end
+                total = getattr(history, 'total', None) or len(history)
+                if end_msg_id > 0:
+                    total = min(total, end_msg_id)
+                on_total(max(total, len(history)))
+                total_known = True
+            
+            yield history
+            
+            offset_id = history[-1].id
+            
+            if len(history) < limit:
+                break
+
+    async def _prefetch(self, pages, depth=PREFETCH_PAGES, max_buffered=PREFETCH_MAX_MESSAGES):
+        """Fetch pages ahead in a producer task while the caller consumes them.
+
+        At most ``depth`` pages and roughly ``max_buffered`` messages are held
+        in memory; the producer waits when either limit is reached.
+        """
+        queue = asyncio.Queue(maxsize=depth)
+        buffered = asyncio.Condition()
+        state = {'messages': 0}
+        
+        async def produce():
+            try:
+                async for page in pages:
+                    async with buffered:
+                        # Always let one page through so a huge page cannot stall us
+                        await buffered.wait_for(lambda: state['messages'] == 0 or state['messages'] + len(page) <= max_buffered)
+                        state['messages'] += len(page)
+                    await queue.put(page)
+                await queue.put(None)
+            except Exception as e:
+                # Hand the error to the consumer so it surfaces in the job
+                await queue.put(e)
+        
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                page = await queue.get()
+                if page is None:
                     break
+                if isinstance(page, Exception):
+                    raise page
                 
-                for message in history:
-                    if self.should_cancel:
-                        break
-                    
-                    try:
-                        # Forward the message
-                        await self.client.forward_messages(
-                            destination_entity,
-                            message
-                        )
-                        
-                        # Update progress
-                        forwarded_count += 1
-                        self.update_progress(
-                            forwarded_messages=forwarded_count,
-                            last_forwarded_id=message.id
-                        )
-                        
-                        # Forward at a rate of 1 message every 3 seconds (20 messages per minute)
-                        await asyncio.sleep(3)
-                    except errors.FloodWaitError as e:
-                        logger.warning(f"Flood wait error: {e.seconds}s")
-                        # Wait the required time
-                        await asyncio.sleep(e.seconds)
-                        # Retry this message
-                        forwarded_count -= 1
-                    except Exception as e:
-                        logger.error(f"Error forwarding message {message.id}: {str(e)}")
-                        # Continue with the next message
-                
-                offset_id = history[-1].id
+                yield page
                 
-                if len(history) < limit:
-                    break
+                async with buffered:
+                    state['messages'] -= len(page)
+                    buffered.notify_all()
+        finally:
+            producer.cancel()
+
+    async def _iter_history(self, source_entity, start_msg_id, end_msg_id=0, limit=100, on_total=None, prefetch=PREFETCH_PAGES):
+        """Stream messages from the source.
+
+        With ``prefetch`` set, upcoming pages are fetched while the current
+        one is being forwarded, hiding the fetch latency.
+        """
+        pages = self._iter_pages(source_entity, start_msg_id, end_msg_id, limit, on_total)
+        if prefetch > 0:
+            pages = self._prefetch(pages, depth=prefetch)
+        
+        try:
+            async for page in pages:
+                for message in page:
+                    yield message
+        finally:
+            # Stop the producer as soon as the consumer is done with us
+            await pages.aclose()
+
+    async def _get_entity(self, entity_id):
+        """Get the input peer of a chat from the shared entity cache, resolving it only on a miss."""
+        return await entity_cache.get_input_entity(self.client, self.phone, entity_id)
+
+    async def _forward_messages_async(self, source_entity_id, destination_entity_id, start_msg_id, last_message_id=None, batched=True):
+        """Async implementation of message forwarding."""
+        try:
+            # Get the source entity
+            source_entity = await self._get_entity(source_entity_id)
+            
+            # Get the destination entity
+            destination_entity = await self._get_entity(destination_entity_id)
+            
+            # If last_message_id is specified, we need to get all messages up to that ID
+            end_msg_id = last_message_id if last_message_id else 0
+            
+            # Forward straight from the stream; progress is fed by the same iterator
+            messages = self._iter_history(source_entity, start_msg_id, end_msg_id)
+            
+            try:
+                if batched:
+                    await self._forward_batched(messages, source_entity, destination_entity)
+                else:
+                    await self._forward_single(messages, destination_entity)
+            finally:
+                await messages.aclose()
         except Exception as e:
             logger.error(f"Error in _forward_messages_async: {str(e)}")
             raise
 
+    def _record_forwarded(self, count, last_id):
+        """Add forwarded messages to the progress and checkpoint the last ID."""
+        forwarded = self.progress['forwarded_messages'] + count
+        self.update_progress(
+            # Grow the total lazily if the estimate was short
+            total_messages=max(self.progress['total_messages'], forwarded),
+            forwarded_messages=forwarded,
+            last_forwarded_id=last_id
+        )
+
+    async def _iter_units(self, messages):
+        """Group messages into forwarding units.
+
+        Messages of one album share a ``grouped_id`` and arrive next to each
+        other; they are yielded together so the album is forwarded in one
+        request and stays whole in the destination. Other messages are
+        yielded on their own.
+        """
+        album = []
+        
+        async for message in messages:
+            grouped_id = getattr(message, 'grouped_id', None)
+            
+            if album and grouped_id != album[0].grouped_id:
+                yield album
+                album = []
+            
+            if grouped_id:
+                album.append(message)
+            else:
+                yield [message]
+        
+        if album:
+            yield album
+
+    async def _forward_single(self, messages, destination_entity):
+        """Forward messages one request at a time, with each album as one request."""
+        async for unit in self._iter_units(messages):
+            await self._wait_while_paused()
+            if self.should_cancel:
+                break
+            
+            await self._forward_unit(unit, destination_entity, self._record_forwarded)
+
+    async def _forward_unit(self, unit, destination_entity, on_forwarded):
+        """Forward one message or album in its own request.
+
+        A unit that fails is skipped and not checkpointed. Returns whether
+        it was forwarded.
+        """
+        chat_key = utils.get_peer_id(destination_entity)
+        
+        while True:
+            # Wait for the shared limiter instead of a fixed sleep
+            await limiter.acquire(self.phone, chat_key)
+            try:
+                # Forward the message, or the whole album
+                with API_LATENCY.time(method='forward_messages'):
+                    await self.client.forward_messages(
+                        destination_entity,
+                        unit
+                    )
+                
+                limiter.on_success(self.phone, chat_key)
+                MESSAGES_FORWARDED.inc(len(unit), account=self.phone, destination=chat_key)
+                
+                # Checkpoint the unit as a whole
+                on_forwarded(len(unit), unit[-1].id)
+                return True
+            except errors.FloodWaitError as e:
+                # The limiter holds the next acquire for the flood wait; retry this unit
+                limiter.on_flood(self.phone, chat_key, e.seconds)
+            except Exception as e:
+                logger.error(f"Error forwarding message {unit[0].id}: {str(e)}")
+                # Continue with the next message
+                return False
+
+    async def _forward_batched(self, messages, source_entity, destination_entity, on_forwarded=None):
+        """Forward messages in chunks, sizing each chunk from FloodWait feedback.
+
+        The chunk grows by a fixed step after every clean request and is
+        halved whenever Telegram asks us to wait. Albums are never split
+        across two chunks.
+        """
+        on_forwarded = on_forwarded or self._record_forwarded
+        batch_size = INITIAL_BATCH_SIZE
+        chunk = []
+        
+        async for unit in self._iter_units(messages):
+            await self._wait_while_paused()
+            if self.should_cancel:
+                break
+            
+            # Cut the chunk before an album that would not fit into it
+            if chunk and len(chunk) + len(unit) > batch_size:
+                batch_size = await self._forward_chunk(chunk, source_entity, destination_entity, batch_size, on_forwarded)
+                chunk = []
+            
+            chunk.extend(unit)
+            if len(chunk) >= batch_size:
+                batch_size = await self._forward_chunk(chunk, source_entity, destination_entity, batch_size, on_forwarded)
+                chunk = []
+        
+        # Flush the remainder unless we were cancelled mid-chunk
+        if chunk and not self.should_cancel:
+            await self._forward_chunk(chunk, source_entity, destination_entity, batch_size, on_forwarded)
+
+    async def _forward_chunk(self, chunk, source_entity, destination_entity, batch_size, on_forwarded):
+        """Forward one chunk in a single request and return the next batch size."""
+        message_ids = [message.id for message in chunk]
+        chat_key = utils.get_peer_id(destination_entity)
+        
+        while True:
+            await limiter.acquire(self.phone, chat_key)
+            try:
+                with API_LATENCY.time(method='forward_messages'):
+                    await self.client.forward_messages(
+                        destination_entity,
+                        message_ids,
+                        from_peer=source_entity
+                    )
+                
+                limiter.on_success(self.phone, chat_key)
+                MESSAGES_FORWARDED.inc(len(chunk), account=self.phone, destination=chat_key)
+                
+                # Checkpoint at the end of the chunk
+                on_forwarded(len(chunk), chunk[-1].id)
+                return min(batch_size + BATCH_GROWTH_STEP, MAX_BATCH_SIZE)
+            except errors.FloodWaitError as e:
+                batch_size = max(batch_size // 2, MIN_BATCH_SIZE)
+                logger.warning(f"Flood wait error: {e.seconds}s, batch size reduced to {batch_size}")
+                # The limiter holds the next acquire for the flood wait; retry this chunk
+                limiter.on_flood(self.phone, chat_key, e.seconds)
+            except Exception as e:
+                logger.warning(f"Error forwarding messages {message_ids[0]}-{message_ids[-1]}: {str(e)}; retrying them one by one")
+                break
+        
+        # Only the message that fails on its own is skipped
+        for unit in split_units(chunk):
+            if self.should_cancel:
+                break
+            await self._forward_unit(unit, destination_entity, on_forwarded)
+        return batch_size
+
+    async def _wait_while_paused(self):
+        """Hold the job between requests while it is paused; the client stays connected."""
+        if not self.paused:
+            return
+        
+        if self.progress['status'] != 'paused':
+            self.update_progress(status='paused')
+            logger.info(f"Forwarding paused for {self.phone}")
+        
+        while self.paused and not self.should_cancel:
+            await asyncio.sleep(PAUSE_POLL_INTERVAL)
+        
+        if not self.should_cancel and self.progress['status'] == 'paused':
+            self.update_progress(status='running')
+            logger.info(f"Forwarding resumed for {self.phone}")
+
+    def pause_forwarding(self):
+        """Pause the current forwarding operation before its next request."""
+        self.paused = True
+
+    def resume_forwarding(self):
+        """Resume a paused forwarding operation."""
+        self.paused = False
+
     def cancel_forwarding(self):
         """Cancel the current forwarding operation."""
         self.should_cancel = True
         logger.info(f"Cancelling forwarding for {self.phone}")
+
+    def interrupt(self):
+        """Stop the current forwarding operation for a shutdown; it is recorded as interrupted and resumed on the next start."""
+        self.interrupted = True
+        self.should_cancel = True
+
+    def stopped_status(self):
+        """Get the status of a run that was stopped before it finished."""
+        return 'interrupted' if self.interrupted else 'cancelled'
@@ -0,0 +1,173 @@
+import os
+import json
+import uuid
+import fcntl
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Statuses of jobs that a previous process left unfinished
+UNFINISHED_STATUSES = ('queued', 'running', 'paused')
+
+# Columns stored for every job, in table order
+JOB_COLUMNS = (
+    'id', 'phone', 'kind', 'status', 'priority', 'details',
+    'total_messages', 'forwarded_messages', 'last_forwarded_id', 'error',
+    'created_at', 'started_at', 'finished_at'
+)
+
+
+class JobStore:
+    """Indexed record of every job, so jobs can be listed and looked up by ID.
+
+    One row per job in a SQLite table, indexed by status and by phone, so
+    listing a page of jobs never reads the user documents. Rows are written
+    when a job changes state; live counters of running jobs come from the
+    scheduler.
+
+    Every row records the store instance (one per process) that owns the
+    job. An owner holds a lock file for as long as its process lives, so
+    other processes can tell its jobs apart from those a dead one left.
+    """
+
+    def __init__(self, data_dir='data'):
+        self.db_path = os.path.join(data_dir, 'jobs.db')
+        self.owners_dir = os.path.join(data_dir, 'job_owners')
+        self.owner = uuid.uuid4().hex
+        self.owner_lock = None  # Held open while this process owns jobs
+        self.local = threading.local()
+
+    def _connect(self):
+        """Get this thread's connection, creating the table on first use."""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with conn:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS jobs (
+                        id TEXT PRIMARY KEY,
+                        phone TEXT NOT NULL,
+                        kind TEXT NOT NULL,
+                        status TEXT NOT NULL,
+                        priority INTEGER NOT NULL DEFAULT 0,
+                        details TEXT NOT NULL DEFAULT '{}',
+                        total_messages INTEGER NOT NULL DEFAULT 0,
+                        forwarded_messages INTEGER NOT NULL DEFAULT 0,
+                        last_forwarded_id INTEGER,
+                        error TEXT,
+                        created_at REAL NOT NULL,
+                        started_at REAL,
+                        finished_at REAL
+                    )
+                ''')
+                columns = [row[1] for row in conn.execute('PRAGMA table_info(jobs)')]
+                if 'owner' not in columns:
+                    conn.execute('ALTER TABLE jobs ADD COLUMN owner TEXT')
+                conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)')
+                conn.execute('CREATE INDEX IF NOT EXISTS jobs_phone ON jobs (phone, created_at)')
+            self.local.conn = conn
+        return conn
+
+    def _to_dict(self, row):
+        job = dict(zip(JOB_COLUMNS, row))
+        job['details'] = json.loads(job['details'])
+        return job
+
+    def _owner_path(self, owner):
+        return os.path.join(self.owners_dir, f"{owner}.lock")
+
+    def _claim(self):
+        """Take this process's owner lock, released only when the process exits."""
+        if self.owner_lock is None:
+            os.makedirs(self.owners_dir, exist_ok=True)
+            lock = open(self._owner_path(self.owner), 'w')
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self.owner_lock = lock
+
+    def _owner_alive(self, owner):
+        """Check whether the process that owns some jobs still holds its lock."""
+        if owner is None:
+            return False
+        if owner == self.owner:
+            return True
+        try:
+            lock = open(self._owner_path(owner), 'r')
+        except FileNotFoundError:
+            return False
+        with lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+        os.remove(self._owner_path(owner))
+        return False
+
+    def save(self, job):
+        """Insert or update a job from its to_dict() view, owned by this process."""
+        self._claim()
+        values = dict(job, details=json.dumps(job.get('details') or {}), owner=self.owner)
+        columns = JOB_COLUMNS + ('owner',)
+        conn = self._connect()
+        with conn:
+            conn.execute(f'''
+                INSERT INTO jobs ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})
+                ON CONFLICT (id) DO UPDATE SET
+                    {', '.join(f'{column} = excluded.{column}' for column in columns[1:])}
+            ''', [values.get(column) for column in columns])
+
+    def get(self, job_id):
+        """Get a stored job by ID, or None."""
+        row = self._connect().execute(
+            f'SELECT {", ".join(JOB_COLUMNS)} FROM jobs WHERE id = ?', (job_id,)
+        ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, status=None, phone=None, limit=50, offset=0):
+        """Get one page of jobs, newest first, and how many match in total."""
+        conditions, params = [], []
+        if status:
+            conditions.append('status = ?')
+            params.append(status)
+        if phone:
+            conditions.append('phone = ?')
+            params.append(phone)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        conn = self._connect()
+        total = conn.execute(f'SELECT COUNT(*) FROM jobs {where}', params).fetchone()[0]
+        rows = conn.execute(
+            f'SELECT {", ".join(JOB_COLUMNS)} FROM jobs {where} ORDER BY created_at DESC LIMIT ? OFFSET ?',
+            params + [limit, offset]
+        ).fetchall()
+        return [self._to_dict(row) for row in rows], total
+
+    def mark_interrupted(self):
+        """Mark jobs whose owning process is gone; they are resumed under new IDs.
+
+        Jobs of processes that are still running, such as the daemon while a
+        bot process starts, are left alone.
+        """
+        placeholders = ', '.join('?' * len(UNFINISHED_STATUSES))
+        conn = self._connect()
+        owners = [row[0] for row in conn.execute(
+            f'SELECT DISTINCT owner FROM jobs WHERE status IN ({placeholders})', UNFINISHED_STATUSES
+        )]
+        dead = [owner for owner in owners if not self._owner_alive(owner)]
+        if not dead:
+            return
+
+        marked = 0
+        with conn:
+            for owner in dead:
+                cursor = conn.execute(
+                    f"UPDATE jobs SET status = 'interrupted' WHERE status IN ({placeholders}) AND owner IS ?",
+                    UNFINISHED_STATUSES + (owner,)
+                )
+                marked += cursor.rowcount
+        if marked:
+            logger.info(f"Marked {marked} unfinished jobs from a previous run as interrupted")
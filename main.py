@@ -1,11 +1,16 @@
 import os
+import time
+import atexit
 import json
 import logging
 import threading
 import asyncio
 import flask
-from flask import Flask, render_template, jsonify, redirect, url_for, request, session, flash
+from flask import Flask, Response, render_template, jsonify, redirect, url_for, request, session, flash, stream_with_context
 from bot_manager import BotManager
+from scheduler import QueueFull, JobConflict
+from rpc import RemoteBotManager
+from metrics import CONTENT_TYPE
 
 # Configure logging
 logging.basicConfig(level=logging.INFO,
@@ -18,11 +23,49 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "telegram-forwarder-secret")
 
-# Create the bot manager
-bot_manager = BotManager()
+# With a forwarding daemon (daemon.py) every web worker talks to it, so
+# any number of workers share one set of Telegram clients and jobs
+FORWARDER_SOCKET = os.environ.get("FORWARDER_SOCKET", "")
 
-# Dictionary to track the bot running state
-bot_running = {'status': False}
+if FORWARDER_SOCKET:
+    bot_manager = RemoteBotManager(FORWARDER_SOCKET)
+else:
+    # Create the bot manager
+    bot_manager = BotManager()
+    
+    # Make sure buffered forwarding progress reaches storage on exit
+    atexit.register(bot_manager.shutdown)
+    
+    # Reconnect saved sessions and resume interrupted jobs without waiting for logins
+    if os.environ.get("REHYDRATE_SESSIONS", "true").lower() == "true":
+        bot_manager.rehydrate()
+
+# Streams send a comment line this often so dead connections are noticed,
+# and end after SSE_MAX_DURATION seconds; the browser reconnects on its own
+SSE_KEEPALIVE = 15
+SSE_MAX_DURATION = int(os.environ.get("SSE_MAX_DURATION", 300))
+
+# Every open stream holds a request thread of this worker, so only this many
+# may be open at once; past that the page is answered 503 and polls instead
+SSE_MAX_STREAMS = int(os.environ.get("SSE_MAX_STREAMS", 8))
+stream_slots = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+
+def sse_event(name, data):
+    """Format one Server-Sent Event."""
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+def sse_response(events):
+    """Stream events if a stream slot is free, otherwise answer 503 so the page falls back to polling."""
+    if not stream_slots.acquire(blocking=False):
+        return jsonify({"success": False, "error": "Too many live streams; poll for status instead"}), 503, {"Retry-After": "30"}
+    
+    response = Response(stream_with_context(events), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # The server closes the response when the stream ends or the client goes away
+    response.call_on_close(stream_slots.release)
+    return response
 
 @app.route('/')
 def home():
@@ -122,6 +165,41 @@ def add_destination():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
+@app.route('/bulk_import', methods=['POST'])
+def bulk_import():
+    phone = request.form.get('phone', '')
+    kind = request.form.get('kind', '')
+    links = request.form.get('links', '')
+    
+    # Links may also come as an uploaded text file, one per line
+    upload = request.files.get('file')
+    if upload:
+        links += '\n' + upload.read().decode('utf-8', errors='ignore')
+    
+    if not phone or not kind or not links.strip():
+        return jsonify({"success": False, "error": "Phone number, kind, and at least one link are required"})
+    
+    try:
+        # Imports are paced by the rate limiter and can take minutes, so they run in the background
+        result = bot_manager.start_bulk_import(phone, kind, links)
+        if not result.get('success'):
+            return jsonify(result)
+        
+        return jsonify(result), 202, {"Location": url_for('get_bulk_import', import_id=result['import_id'])}
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
+
+@app.route('/bulk_import/<import_id>', methods=['GET'])
+def get_bulk_import(import_id):
+    try:
+        entry = bot_manager.get_bulk_import(import_id)
+        if not entry:
+            return jsonify({"success": False, "error": "Import not found"}), 404
+        
+        return jsonify({"success": True, "import": entry})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @app.route('/set_last_message', methods=['POST'])
 def set_last_message():
     phone = request.form.get('phone', '')
@@ -147,13 +225,45 @@ def start_forwarding():
         return jsonify({"success": False, "error": "Phone number, source ID, and destination ID are required"})
     
     try:
-        # Start the forwarding in a separate thread to avoid blocking the main thread
-        threading.Thread(
-            target=bot_manager.start_forwarding,
-            args=(phone, source_id, destination_id)
-        ).start()
+        priority = request.form.get('priority', 0, type=int)
+        
+        # The job is queued on the account's scheduler, so this returns at once
+        job = bot_manager.start_forwarding(phone, source_id, destination_id, priority)
+        if not job:
+            return jsonify({"success": False, "error": "Could not start forwarding"})
+        
+        return jsonify({"success": True, "job_id": job.id, "status": job.status, "queue": bot_manager.get_queue_depth()}), 202
+    except QueueFull as e:
+        # Tell the caller to back off instead of piling up work
+        return jsonify({"success": False, "error": str(e), "queue": bot_manager.get_queue_depth()}), 429, {"Retry-After": "30"}
+    except JobConflict as e:
+        return jsonify({"success": False, "error": str(e), "job_id": e.job_id}), 409
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
+
+@app.route('/start_fan_out', methods=['POST'])
+def start_fan_out():
+    phone = request.form.get('phone', '')
+    source_id = request.form.get('source_id', '')
+    destination_ids = request.form.getlist('destination_ids')
+    
+    if not phone or not source_id or not destination_ids:
+        return jsonify({"success": False, "error": "Phone number, source ID, and at least one destination ID are required"})
+    
+    try:
+        priority = request.form.get('priority', 0, type=int)
         
-        return jsonify({"success": True})
+        # The source is read once and forwarded to every destination in parallel
+        job = bot_manager.start_fan_out(phone, source_id, destination_ids, priority)
+        if not job:
+            return jsonify({"success": False, "error": "Could not start forwarding"})
+        
+        return jsonify({"success": True, "job_id": job.id, "status": job.status, "queue": bot_manager.get_queue_depth()}), 202
+    except QueueFull as e:
+        # Tell the caller to back off instead of piling up work
+        return jsonify({"success": False, "error": str(e), "queue": bot_manager.get_queue_depth()}), 429, {"Retry-After": "30"}
+    except JobConflict as e:
+        return jsonify({"success": False, "error": str(e), "job_id": e.job_id}), 409
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
@@ -170,6 +280,127 @@ def cancel_forwarding():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    phone = request.args.get('phone', '')
+    
+    if not phone:
+        return jsonify({"success": False, "error": "Phone number is required"})
+    
+    try:
+        return jsonify({"success": True, "jobs": bot_manager.list_jobs(phone)})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
+
+@app.route('/job_queue', methods=['GET'])
+def job_queue():
+    try:
+        return jsonify({"success": True, "queue": bot_manager.get_queue_depth()})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
+
+# Largest page size of the jobs API
+API_MAX_PER_PAGE = 200
+
+@app.route('/api/jobs', methods=['POST'])
+def api_create_job():
+    # Automation usually sends JSON; forms work as well
+    data = request.get_json(silent=True) or request.form
+    phone = data.get('phone', '')
+    source_id = data.get('source_id', '')
+    destination_id = data.get('destination_id', '')
+    destination_ids = data.get('destination_ids') if request.is_json else request.form.getlist('destination_ids')
+    
+    if not phone or not source_id or not (destination_id or destination_ids):
+        return jsonify({"success": False, "error": "Phone number, source ID, and a destination ID or destination IDs are required"}), 400
+    
+    try:
+        priority = int(data.get('priority', 0))
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "Priority must be an integer"}), 400
+    
+    try:
+        if destination_ids:
+            job = bot_manager.start_fan_out(phone, source_id, list(destination_ids), priority)
+        else:
+            job = bot_manager.start_forwarding(phone, source_id, destination_id, priority)
+        if not job:
+            return jsonify({"success": False, "error": "Could not start forwarding"}), 400
+        
+        return jsonify({"success": True, "job": job.to_dict()}), 202, {"Location": url_for('api_get_job', job_id=job.id)}
+    except QueueFull as e:
+        return jsonify({"success": False, "error": str(e), "queue": bot_manager.get_queue_depth()}), 429, {"Retry-After": "30"}
+    except JobConflict as e:
+        return jsonify({"success": False, "error": str(e), "job_id": e.job_id}), 409
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/jobs', methods=['GET'])
+def api_list_jobs():
+    status = request.args.get('status') or None
+    phone = request.args.get('phone') or None
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), API_MAX_PER_PAGE)
+    
+    try:
+        return jsonify({"success": True, **bot_manager.find_jobs(status, phone, page, per_page)})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def api_get_job(job_id):
+    try:
+        job = bot_manager.get_job(job_id)
+        if not job:
+            return jsonify({"success": False, "error": "Job not found"}), 404
+        
+        return jsonify({"success": True, "job": job})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+def job_action_response(result, job_id):
+    """Turn a job action result into a response: 404 for unknown jobs, 409 for wrong states."""
+    if result.get('success'):
+        return jsonify({"success": True, "job": bot_manager.get_job(job_id)})
+    if result.get('error') == "Job not found":
+        return jsonify(result), 404
+    return jsonify(result), 409
+
+@app.route('/api/jobs/<job_id>/pause', methods=['POST'])
+def api_pause_job(job_id):
+    try:
+        return job_action_response(bot_manager.pause_job(job_id), job_id)
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/jobs/<job_id>/resume', methods=['POST'])
+def api_resume_job(job_id):
+    try:
+        return job_action_response(bot_manager.resume_job(job_id), job_id)
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def api_cancel_job(job_id):
+    try:
+        return job_action_response(bot_manager.cancel_job(None, job_id), job_id)
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/cancel_job', methods=['POST'])
+def cancel_job():
+    phone = request.form.get('phone', '')
+    job_id = request.form.get('job_id', '')
+    
+    if not phone or not job_id:
+        return jsonify({"success": False, "error": "Phone number and job ID are required"})
+    
+    try:
+        result = bot_manager.cancel_job(phone, job_id)
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
+
 @app.route('/get_forwarding_status', methods=['GET'])
 def get_forwarding_status():
     phone = request.args.get('phone', '')
@@ -183,6 +414,38 @@ def get_forwarding_status():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
+@app.route('/forwarding_status/stream', methods=['GET'])
+def forwarding_status_stream():
+    """Push the forwarding status as it changes instead of being polled."""
+    phone = request.args.get('phone', '')
+    
+    if not phone:
+        return jsonify({"success": False, "error": "Phone number is required"}), 400
+    
+    def events():
+        subscription = bot_manager.listen_progress(phone)
+        try:
+            # Send the full status once, then only the fields that change
+            status = bot_manager.get_forwarding_status(phone)
+            yield "retry: 3000\n\n"
+            yield sse_event('status', status)
+            
+            deadline = time.monotonic() + SSE_MAX_DURATION
+            while time.monotonic() < deadline:
+                if subscription.get(timeout=SSE_KEEPALIVE) is None:
+                    yield ": keepalive\n\n"
+                    continue
+                
+                latest = bot_manager.get_forwarding_status(phone)
+                delta = {key: value for key, value in latest.items() if status.get(key) != value}
+                if delta:
+                    status = latest
+                    yield sse_event('delta', delta)
+        finally:
+            subscription.close()
+    
+    return sse_response(events())
+
 @app.route('/logout', methods=['POST'])
 def logout():
     phone = request.form.get('phone', '')
@@ -229,18 +492,42 @@ def delete_destination():
 
 @app.route('/bot_status', methods=['GET'])
 def get_bot_status():
-    return jsonify({"status": "running" if bot_running['status'] else "stopped"})
+    return jsonify({"status": bot_manager.get_bot_status()})
+
+@app.route('/bot_status/stream', methods=['GET'])
+def bot_status_stream():
+    """Push the bot status whenever it is started or stopped."""
+    def events():
+        # Subscribe first so a change between the read and the wait is not lost
+        subscription = bot_manager.listen_bot_status()
+        try:
+            status = bot_manager.get_bot_status()
+            yield "retry: 3000\n\n"
+            yield sse_event('status', {"status": status})
+            
+            deadline = time.monotonic() + SSE_MAX_DURATION
+            while time.monotonic() < deadline:
+                event = subscription.get(timeout=SSE_KEEPALIVE)
+                if event is None or event['status'] == status:
+                    yield ": keepalive\n\n"
+                else:
+                    status = event['status']
+                    yield sse_event('status', {"status": status})
+        finally:
+            subscription.close()
+    
+    return sse_response(events())
 
 @app.route('/start_bot', methods=['POST'])
 def start_bot():
     # Logic to start the Telegram bot
-    bot_running['status'] = True
+    bot_manager.set_bot_running(True)
     return jsonify({"message": "Bot started successfully"})
 
 @app.route('/stop_bot', methods=['POST'])
 def stop_bot():
     # Logic to stop the Telegram bot
-    bot_running['status'] = False
+    bot_manager.set_bot_running(False)
     return jsonify({"message": "Bot stopped successfully"})
 
 @app.route('/test_dashboard')
@@ -270,9 +557,18 @@ def test_dashboard():
     }
     return render_template('dashboard.html', phone='123456789', user_data=sample_data)
 
+@app.route('/client_pool', methods=['GET'])
+def client_pool():
+    return jsonify({"success": True, "pool": bot_manager.get_pool_metrics()})
+
 @app.route('/health')
 def health():
     return jsonify({"status": "ok"})
 
+@app.route('/metrics')
+def metrics():
+    # Forwarding metrics live in whichever process runs the jobs
+    return Response(bot_manager.render_metrics(), content_type=CONTENT_TYPE)
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
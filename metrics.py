@@ -0,0 +1,235 @@
+import time
+import logging
+import functools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """A named family of samples, one per combination of label values."""
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}  # Maps label value tuples to samples
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self):
+        """Get the metric in the Prometheus text format."""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self.lock:
+            samples = list(self.values.items())
+        for key, value in sorted(samples):
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}']
+
+
+class Counter(Metric):
+    """A value that only goes up, such as messages forwarded."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A value that goes up and down, or is read from a callback at scrape time."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback  # Returns {label value tuple: value}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def render(self):
+        if self.callback is not None:
+            try:
+                values = self.callback()
+            except Exception as e:
+                logger.error(f"Error collecting metric {self.name}: {str(e)}")
+                values = {}
+            with self.lock:
+                self.values = {tuple(str(part) for part in key): value for key, value in values.items()}
+        return super().render()
+
+
+class Histogram(Metric):
+    """Counts of observations in buckets, such as request latencies."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            sample = self.values.get(key)
+            if sample is None:
+                sample = self.values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample['counts'][index] += 1
+                    break
+            sample['sum'] += value
+
+    def time(self, **labels):
+        """Get a context manager that observes how long its block takes."""
+        return Timer(self, labels)
+
+    def _render_sample(self, key, sample):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, sample['counts']):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f'{self.name}_sum{labels} {_format_value(sample["sum"])}')
+        lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+def timed(histogram, operation):
+    """Decorate an async function so each call is observed in a histogram with an operation label."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with histogram.time(operation=operation):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class MetricsRegistry:
+    """Every metric of this process, rendered on demand for Prometheus.
+
+    Recording a sample is a dict update under a lock; nothing is formatted
+    until the registry is scraped, and callback gauges are only computed then.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def _register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                return self.metrics[metric.name]
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None):
+        return self._register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Get every metric in the Prometheus text exposition format."""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# The registry shared by every module in this process
+registry = MetricsRegistry()
+
+# Forwarding hot path, in Forwarder and the bot's regix plugin
+MESSAGES_FETCHED = registry.counter('forwarder_messages_fetched_total', 'Messages read from source chats.', ('account',))
+MESSAGES_FORWARDED = registry.counter('forwarder_messages_forwarded_total', 'Messages delivered to destination chats.', ('account', 'destination'))
+API_LATENCY = registry.histogram('telegram_api_request_seconds', 'Latency of Telegram API calls.', ('method',))
+
+# Flood control, in the shared rate limiter
+FLOOD_WAITS = registry.counter('telegram_flood_waits_total', 'FloodWait errors returned by Telegram.', ('account',))
+FLOOD_WAIT_SECONDS = registry.counter('telegram_flood_wait_seconds_total', 'Seconds Telegram asked us to wait.', ('account',))
+RATE_LIMIT_SLEEP_SECONDS = registry.counter('rate_limiter_sleep_seconds_total', 'Seconds spent waiting for a send token.', ('account',))
+
+# Data layers
+CHECKPOINT_LATENCY = registry.histogram('checkpoint_write_seconds', 'Latency of writing buffered progress to storage.', ('backend',))
+DATABASE_LATENCY = registry.histogram('database_query_seconds', 'Latency of bot database queries.', ('operation',))
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are too frequent to log
+        pass
+
+
+def start_http_server(port, host='0.0.0.0'):
+    """Serve the registry on its own port, for processes without a web app."""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True)
+    thread.start()
+    logger.info(f"Serving metrics on port {port}")
+    return server
@@ -21,8 +21,11 @@ class Config:
     FORCE_SUB_CHANNEL = environ.get("FORCE_SUB_CHANNEL", "0") # FORCE SUB channel link 
     FORCE_SUB_ON = environ.get("FORCE_SUB_ON", "FALSE")  # FORCE SUB ON - OFF
     
-    # New settings for improved forwarding
-    FORWARD_SLEEP = 3  # Sleep time between forwards in seconds (changed from 10 to 3)
+    # Forwarding pace is handled by the shared limiter in rate_limiter.py
+    # (RATE_LIMIT_INITIAL / RATE_LIMIT_MIN / RATE_LIMIT_MAX, in requests per second)
+    
+    # Port for Prometheus metrics of the bot process; 0 turns them off
+    METRICS_PORT = int(environ.get("METRICS_PORT", "0"))
 
 
 class temp(object): 
@@ -8,6 +8,7 @@ import psycopg2
 import logging
 from config import Config
 import asyncpg
+from metrics import DATABASE_LATENCY, timed
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -434,6 +435,7 @@ class Database:
     
     # Task management methods for resume functionality
     
+    @timed(DATABASE_LATENCY, 'save_forwarding_task')
     async def save_forwarding_task(self, task_id, data):
         """Save a forwarding task for potential resume later"""
         await self.connect()
@@ -492,6 +494,7 @@ class Database:
                 
             return True
     
+    @timed(DATABASE_LATENCY, 'get_task')
     async def get_task(self, task_id):
         """Get a task by its ID"""
         await self.connect()
@@ -526,6 +529,7 @@ class Database:
                 
             return result
     
+    @timed(DATABASE_LATENCY, 'update_task_status')
     async def update_task_status(self, task_id, status, last_msg_id=None):
         """Update task status and optionally the last forwarded message ID"""
         await self.connect()
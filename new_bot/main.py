@@ -11,6 +11,7 @@ import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from new_bot.database import db, mongodb_version
 from new_bot.config import Config, temp
+from metrics import start_http_server
 
 # Configure logging
 logging.basicConfig(
@@ -40,6 +41,10 @@ async def main():
     os.makedirs("logs", exist_ok=True)
     os.makedirs("sessions", exist_ok=True)
     
+    # The bot runs outside the web app, so it serves its own metrics
+    if Config.METRICS_PORT:
+        start_http_server(Config.METRICS_PORT)
+    
     # Connect to the database
     try:
         await db.connect()
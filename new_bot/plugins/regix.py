@@ -8,17 +8,23 @@ import logging
 from .utils import STS
 from database import db 
 from .test import CLIENT, start_clone_bot
-from config import Config, temp
+from config import temp
 from translation import Translation
+from rate_limiter import limiter
+from metrics import MESSAGES_FETCHED, MESSAGES_FORWARDED, API_LATENCY
 from pyrogram import Client, filters 
 from pyrogram.errors import FloodWait, MessageNotModified, RPCError
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery, Message 
+from pyrogram.types import InputMediaPhoto, InputMediaVideo, InputMediaDocument, InputMediaAudio
 
 CLIENT = CLIENT()
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 TEXT = Translation.TEXT1
 
+# How an album item is sent again by file ID, by its media type
+ALBUM_MEDIA = {'photo': InputMediaPhoto, 'video': InputMediaVideo, 'document': InputMediaDocument, 'audio': InputMediaAudio}
+
 @Client.on_callback_query(filters.regex(r'^start_public'))
 async def pub_(bot, message):
     user = message.from_user.id
@@ -99,9 +105,6 @@ async def pub_(bot, message):
     await send(client, user, "<b>🚥 Forwarding started via Advanced Forwarder Bot</b>")
     sts.add(time=True)
     
-    # Use faster interval (3 seconds instead of 10)
-    sleep = Config.FORWARD_SLEEP
-    
     await msg_edit(m, "<b>Processing...</b>") 
     temp.IS_FRWD_CHAT.append(i.TO)
     temp.lock[user] = locked = True
@@ -109,6 +112,8 @@ async def pub_(bot, message):
     if locked:
         try:
           MSG = []
+          ALBUM = []
+          opts = {"task_id": task_id, "forward_tag": forward_tag, "caption": caption, "button": button, "protect": protect}
           pling = 0
           await edit(m, 'Progressing', 10, sts)
           print(f"Starting Forwarding Process... From: {sts.get('FROM')} To: {sts.get('TO')} Total: {sts.get('limit')} Skip: {sts.get('skip')})")
@@ -130,6 +135,7 @@ async def pub_(bot, message):
                 
                 pling += 1
                 sts.add('fetched')
+                MESSAGES_FETCHED.inc(account=client.name)
                 
                 # Skip invalid messages
                 if message == "DUPLICATE":
@@ -142,33 +148,21 @@ async def pub_(bot, message):
                    sts.add('deleted')
                    continue
                 
-                # Forward messages with tag (as a batch)
-                if forward_tag:
-                   MSG.append(message.id)
-                   notcompleted = len(MSG)
-                   completed = sts.get('total') - sts.get('fetched')
-                   
-                   # Forward in batches of 100 or when near end
-                   if (notcompleted >= 100 or completed <= 100): 
-                      await forward(client, MSG, m, sts, protect)
-                      sts.add('total_files', notcompleted)
-                      
-                      # Update the last forwarded message for resume capability
-                      await db.update_task_status(task_id, "active", message.id)
-                      
-                      await asyncio.sleep(sleep)
-                      MSG = []
-                else:
-                   # Forward messages individually with custom caption
-                   new_caption = custom_caption(message, caption)
-                   details = {"msg_id": message.id, "media": media(message), "caption": new_caption, 'button': button, "protect": protect}
-                   await copy(client, details, m, sts)
-                   sts.add('total_files')
-                   
-                   # Update the last forwarded message for resume capability
-                   await db.update_task_status(task_id, "active", message.id)
-                   
-                   await asyncio.sleep(sleep)
+                # Collect albums whole so each one goes out in a single request
+                if ALBUM and message.media_group_id != ALBUM[0].media_group_id:
+                   MSG = await send_unit(client, ALBUM, MSG, m, sts, opts)
+                   ALBUM = []
+                if message.media_group_id:
+                   ALBUM.append(message)
+                   continue
+                
+                # Forward with tag (batched) or copy with custom caption
+                MSG = await send_unit(client, [message], MSG, m, sts, opts)
+          
+          # Send the last album and whatever is left of the batch
+          if ALBUM:
+             MSG = await send_unit(client, ALBUM, MSG, m, sts, opts)
+          await flush_batch(client, MSG, m, sts, opts)
         
         except FloodWait as e:
             # Handle rate limiting by Telegram
@@ -282,9 +276,6 @@ async def resume_forwarding_task(bot, message):
     await send(client, user, "<b>🚥 Resuming forwarding...</b>")
     sts.add(time=True)
     
-    # Use faster interval
-    sleep = Config.FORWARD_SLEEP
-    
     await msg_edit(m, "<b>Processing...</b>") 
     temp.IS_FRWD_CHAT.append(to_chat)
     temp.lock[user] = locked = True
@@ -293,6 +284,8 @@ async def resume_forwarding_task(bot, message):
     if locked:
         try:
             MSG = []
+            ALBUM = []
+            opts = {"task_id": task_id, "forward_tag": forward_tag, "caption": caption, "button": button, "protect": protect}
             pling = 0
             await edit(m, 'Resuming', 10, sts)
             logger.info(f"Resuming Forwarding... From: {from_chat} To: {to_chat} Starting after: {skip}")
@@ -318,6 +311,7 @@ async def resume_forwarding_task(bot, message):
                 
                 pling += 1
                 sts.add('fetched')
+                MESSAGES_FETCHED.inc(account=client.name)
                 
                 if message == "DUPLICATE":
                     sts.add('duplicate')
@@ -329,30 +323,20 @@ async def resume_forwarding_task(bot, message):
                     sts.add('deleted')
                     continue
                 
-                if forward_tag:
-                    MSG.append(message.id)
-                    notcompleted = len(MSG)
-                    completed = sts.get('total') - sts.get('fetched')
-                    
-                    if (notcompleted >= 100 or completed <= 100): 
-                        await forward(client, MSG, m, sts, protect)
-                        sts.add('total_files', notcompleted)
-                        
-                        # Update last forwarded message
-                        await db.update_task_status(task_id, "active", message.id)
-                        
-                        await asyncio.sleep(sleep)
-                        MSG = []
-                else:
-                    new_caption = custom_caption(message, caption)
-                    details = {"msg_id": message.id, "media": media(message), "caption": new_caption, 'button': button, "protect": protect}
-                    await copy(client, details, m, sts)
-                    sts.add('total_files')
-                    
-                    # Update last forwarded message
-                    await db.update_task_status(task_id, "active", message.id)
-                    
-                    await asyncio.sleep(sleep)
+                # Collect albums whole so each one goes out in a single request
+                if ALBUM and message.media_group_id != ALBUM[0].media_group_id:
+                    MSG = await send_unit(client, ALBUM, MSG, m, sts, opts)
+                    ALBUM = []
+                if message.media_group_id:
+                    ALBUM.append(message)
+                    continue
+                
+                MSG = await send_unit(client, [message], MSG, m, sts, opts)
+            
+            # Send the last album and whatever is left of the batch
+            if ALBUM:
+                MSG = await send_unit(client, ALBUM, MSG, m, sts, opts)
+            await flush_batch(client, MSG, m, sts, opts)
             
         except FloodWait as e:
             logger.warning(f"FloodWait encountered during resume: {e.value} seconds")
@@ -387,43 +371,136 @@ async def resume_forwarding_task(bot, message):
         await stop(client, user)
 
 
+async def send_unit(client, unit, MSG, m, sts, opts):
+   """Send one message or one whole album and return the pending forward batch.
+
+   With forward tag the unit joins the batch of IDs, which is cut before
+   an album that would not fit so albums are never split. Otherwise the
+   unit is copied right away, an album with a single copy_media_group call.
+   """
+   if opts["forward_tag"]:
+      if len(MSG) + len(unit) > 100:
+         await flush_batch(client, MSG, m, sts, opts)
+         MSG = []
+      MSG.extend(message.id for message in unit)
+      if len(MSG) >= 100:
+         await flush_batch(client, MSG, m, sts, opts)
+         MSG = []
+      return MSG
+   
+   if len(unit) > 1:
+      await copy_album(client, unit, m, sts, opts)
+   else:
+      message = unit[0]
+      new_caption = custom_caption(message, opts["caption"])
+      details = {"msg_id": message.id, "media": media(message), "caption": new_caption, 'button': opts["button"], "protect": opts["protect"]}
+      await copy(client, details, m, sts)
+   sts.add('total_files', len(unit))
+   
+   # Update the last forwarded message for resume capability
+   await db.update_task_status(opts["task_id"], "active", unit[-1].id)
+   return MSG
+
+async def flush_batch(client, MSG, m, sts, opts):
+   """Forward a batch of message IDs in one request and checkpoint its last ID."""
+   if not MSG:
+      return
+   await forward(client, MSG, m, sts, opts["protect"])
+   sts.add('total_files', len(MSG))
+   
+   # Update the last forwarded message for resume capability
+   await db.update_task_status(opts["task_id"], "active", MSG[-1])
+
+async def copy_album(bot, album, m, sts, opts):
+   await limiter.acquire(bot.name, sts.get('TO'))
+   captions = [custom_caption(message, opts["caption"]) or "" for message in album]
+   try:
+     if opts["protect"]:
+       # copy_media_group cannot protect content, so the files are sent again by ID
+       with API_LATENCY.time(method='send_media_group'):
+         sent = await bot.send_media_group(
+               chat_id=sts.get('TO'),
+               media=[ALBUM_MEDIA[message.media.value](media(message), caption=caption) for message, caption in zip(album, captions)],
+               protect_content=True)
+     else:
+       with API_LATENCY.time(method='copy_media_group'):
+         sent = await bot.copy_media_group(
+               chat_id=sts.get('TO'),
+               from_chat_id=sts.get('FROM'),
+               message_id=album[0].id,
+               captions=captions)
+     limiter.on_success(bot.name, sts.get('TO'))
+     MESSAGES_FORWARDED.inc(len(album), account=bot.name, destination=sts.get('TO'))
+   except FloodWait as e:
+     limiter.on_flood(bot.name, sts.get('TO'), e.value)
+     await edit(m, 'Progressing', e.value, sts)
+     await copy_album(bot, album, m, sts, opts)
+     return
+   except Exception as e:
+     logger.error(f"Album copy error: {str(e)}")
+     sts.add('deleted', len(album))
+     return
+   
+   if opts["button"]:
+     await add_album_button(bot, sent[0], opts["button"])
+
+async def add_album_button(bot, message, button):
+   """Attach the button to the first message of a sent album, which cannot carry one itself."""
+   try:
+     with API_LATENCY.time(method='edit_message_reply_markup'):
+       await bot.edit_message_reply_markup(message.chat.id, message.id, reply_markup=button)
+   except FloodWait as e:
+     await asyncio.sleep(e.value)
+     await add_album_button(bot, message, button)
+   except Exception as e:
+     logger.warning(f"Could not add the button to an album: {str(e)}")
+
 async def copy(bot, msg, m, sts):
+   # Pace sends through the shared limiter instead of a fixed sleep
+   await limiter.acquire(bot.name, sts.get('TO'))
    try:                                  
      if msg.get("media") and msg.get("caption"):
-        await bot.send_cached_media(
-              chat_id=sts.get('TO'),
-              file_id=msg.get("media"),
-              caption=msg.get("caption"),
-              reply_markup=msg.get('button'),
-              protect_content=msg.get("protect"))
+        with API_LATENCY.time(method='send_cached_media'):
+          await bot.send_cached_media(
+                chat_id=sts.get('TO'),
+                file_id=msg.get("media"),
+                caption=msg.get("caption"),
+                reply_markup=msg.get('button'),
+                protect_content=msg.get("protect"))
      else:
-        await bot.copy_message(
-              chat_id=sts.get('TO'),
-              from_chat_id=sts.get('FROM'),    
-              caption=msg.get("caption"),
-              message_id=msg.get("msg_id"),
-              reply_markup=msg.get('button'),
-              protect_content=msg.get("protect"))
+        with API_LATENCY.time(method='copy_message'):
+          await bot.copy_message(
+                chat_id=sts.get('TO'),
+                from_chat_id=sts.get('FROM'),    
+                caption=msg.get("caption"),
+                message_id=msg.get("msg_id"),
+                reply_markup=msg.get('button'),
+                protect_content=msg.get("protect"))
+     limiter.on_success(bot.name, sts.get('TO'))
+     MESSAGES_FORWARDED.inc(account=bot.name, destination=sts.get('TO'))
    except FloodWait as e:
+     # The limiter holds the retry for the flood wait
+     limiter.on_flood(bot.name, sts.get('TO'), e.value)
      await edit(m, 'Progressing', e.value, sts)
-     await asyncio.sleep(e.value)
-     await edit(m, 'Progressing', 10, sts)
      await copy(bot, msg, m, sts)
    except Exception as e:
      logger.error(f"Copy error: {str(e)}")
      sts.add('deleted')
         
 async def forward(bot, msg, m, sts, protect):
+   await limiter.acquire(bot.name, sts.get('TO'))
    try:                             
-     await bot.forward_messages(
-           chat_id=sts.get('TO'),
-           from_chat_id=sts.get('FROM'), 
-           protect_content=protect,
-           message_ids=msg)
+     with API_LATENCY.time(method='forward_messages'):
+       await bot.forward_messages(
+             chat_id=sts.get('TO'),
+             from_chat_id=sts.get('FROM'), 
+             protect_content=protect,
+             message_ids=msg)
+     limiter.on_success(bot.name, sts.get('TO'))
+     MESSAGES_FORWARDED.inc(len(msg), account=bot.name, destination=sts.get('TO'))
    except FloodWait as e:
+     limiter.on_flood(bot.name, sts.get('TO'), e.value)
      await edit(m, 'Progressing', e.value, sts)
-     await asyncio.sleep(e.value)
-     await edit(m, 'Progressing', 10, sts)
      await forward(bot, msg, m, sts, protect)
    except Exception as e:
      logger.error(f"Forward error: {str(e)}")
@@ -0,0 +1,113 @@
+import os
+import time
+import queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Least time between two progress events of the same job, in seconds;
+# status changes are always published
+PROGRESS_EVENT_INTERVAL = float(os.environ.get("PROGRESS_EVENT_INTERVAL", 0.5))
+
+FINAL_STATUSES = ('completed', 'cancelled', 'failed', 'interrupted')
+
+
+class ProgressBus:
+    """In-process publish/subscribe channel for job progress.
+
+    Forwarders publish events; subscribers (BotManager's status snapshot,
+    web streams, the bot, metrics) are called with every event that gets
+    through the per-job rate limit. Callbacks run on the publisher's thread,
+    usually the forwarding runtime, so they must return quickly.
+    Subscribers may listen to one account only, so an event costs one call
+    per interested listener rather than one per listener overall.
+    """
+
+    def __init__(self, interval=PROGRESS_EVENT_INTERVAL):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.subscribers = {}  # Maps a phone number (None for all) to callbacks
+        self.last_published = {}  # Maps (phone, job ID) to the time of its last event
+
+    def subscribe(self, callback, phone=None):
+        """Call ``callback(event)`` for every published event, or only those of one account."""
+        with self.lock:
+            self.subscribers.setdefault(phone, []).append(callback)
+        return callback
+
+    def unsubscribe(self, callback, phone=None):
+        with self.lock:
+            callbacks = self.subscribers.get(phone, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self.subscribers.pop(phone, None)
+
+    def listen(self, phone=None):
+        """Get a Subscription that a thread can block on."""
+        return Subscription(self, phone)
+
+    def publish(self, event, force=False):
+        """Hand an event to every subscriber unless the job published one too recently.
+
+        Returns whether the event was published.
+        """
+        key = (event.get('phone'), event.get('job_id'))
+        now = time.monotonic()
+
+        with self.lock:
+            if not force and now - self.last_published.get(key, float('-inf')) < self.interval:
+                return False
+
+            if event.get('status') in FINAL_STATUSES:
+                self.last_published.pop(key, None)
+            else:
+                self.last_published[key] = now
+            subscribers = self.subscribers.get(None, []) + self.subscribers.get(event.get('phone'), [])
+
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                logger.error(f"Error in progress subscriber: {str(e)}")
+        return True
+
+
+class Subscription:
+    """A queue of events for one listener, such as a web stream.
+
+    If the listener falls behind, the oldest queued events are dropped;
+    progress events supersede each other, so only the latest ones matter.
+    """
+
+    def __init__(self, bus, phone=None, maxsize=100):
+        self.bus = bus
+        self.phone = phone
+        self.queue = queue.Queue(maxsize=maxsize)
+        bus.subscribe(self._on_event, phone)
+
+    def _on_event(self, event):
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """Wait for the next event; returns None on timeout."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self._on_event, self.phone)
+
+
+# The bus shared by every Forwarder and listener in this process
+progress_bus = ProgressBus()
@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import fcntl
+import logging
+import threading
+from contextlib import contextmanager
+from checkpoint import Journal
+
+logger = logging.getLogger(__name__)
+
+# How often appended records are fsynced, in seconds
+PROGRESS_FSYNC_INTERVAL = float(os.environ.get("PROGRESS_FSYNC_INTERVAL", 1))
+
+# Compact a journal into its snapshot once it holds this many records
+PROGRESS_COMPACT_EVERY = int(os.environ.get("PROGRESS_COMPACT_EVERY", 1000))
+
+
+class ProgressStore:
+    """Log-structured store for forwarding progress, kept apart from user files.
+
+    Each account has a snapshot file and an append-only journal of
+    ``(task_key, progress)`` records. Writes are O(1) appends; a background
+    thread fsyncs them in batches and compacts long journals into the
+    snapshot, so recovery only replays the tail written since the last
+    compaction.
+
+    Several processes (the web app, the bots) may share the files: each
+    account has a lock file held around every read, append and compaction,
+    and a process rereads an account whenever its files changed on disk
+    since it last looked.
+    """
+
+    def __init__(self, data_dir='data'):
+        self.progress_dir = os.path.join(data_dir, 'progress')
+        if not os.path.exists(self.progress_dir):
+            os.makedirs(self.progress_dir)
+
+        self.lock = threading.Lock()
+        self.states = {}  # Maps phone numbers to their progress, keyed by task
+        self.journals = {}  # Maps phone numbers to their open journals
+        self.record_counts = {}  # Maps phone numbers to the records in their journal
+        self.signatures = {}  # Maps phone numbers to the state of their files when last read
+        self.dirty = set()  # Phone numbers with appends that are not fsynced yet
+        self.worker = None
+
+    def _path(self, phone, suffix):
+        return os.path.join(self.progress_dir, f"{phone}.{suffix}")
+
+    @contextmanager
+    def _file_lock(self, phone, operation=fcntl.LOCK_EX, name='lock'):
+        """Hold one of an account's lock files; taken before self.lock, never after."""
+        with open(self._path(phone, name), 'a') as f:
+            fcntl.flock(f, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _signature(self, phone):
+        """Identify the current version of an account's files."""
+        signature = []
+        for suffix in ('snapshot.json', 'journal.old', 'journal'):
+            try:
+                stat = os.stat(self._path(phone, suffix))
+                signature.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _load(self, phone):
+        """Load an account's snapshot and replay its journal tail (both locks held).
+
+        The cached state is reused unless another process wrote or compacted
+        the files since.
+        """
+        signature = self._signature(phone)
+        if phone in self.states and self.signatures.get(phone) == signature:
+            return self.states[phone]
+
+        # The open journal may have been compacted away by another process
+        journal = self.journals.pop(phone, None)
+        if journal:
+            journal.close()
+
+        state = {}
+        snapshot_path = self._path(phone, 'snapshot.json')
+        if os.path.exists(snapshot_path):
+            try:
+                with open(snapshot_path, 'r') as f:
+                    state = json.load(f)
+            except Exception as e:
+                logger.error(f"Error reading progress snapshot for {phone}: {str(e)}")
+
+        # A journal left mid-compaction comes before the live one
+        count = 0
+        for suffix in ('journal.old', 'journal'):
+            for record in Journal(self._path(phone, suffix)).read():
+                state[record['key']] = record['progress']
+                count += 1
+
+        self.states[phone] = state
+        self.journals[phone] = Journal(self._path(phone, 'journal'))
+        self.record_counts[phone] = count
+        self.signatures[phone] = signature
+        return state
+
+    def get(self, phone):
+        """Get a copy of all progress entries of an account."""
+        with self._file_lock(phone, fcntl.LOCK_SH), self.lock:
+            return {key: dict(progress) for key, progress in self._load(phone).items()}
+
+    def append(self, phone, progress):
+        """Record new progress for some tasks with one append per task."""
+        try:
+            with self._file_lock(phone), self.lock:
+                state = self._load(phone)
+                journal = self.journals[phone]
+                for key, entry in progress.items():
+                    journal.append({'key': key, 'progress': entry})
+                    state[key] = entry
+                self.record_counts[phone] += len(progress)
+                self.signatures[phone] = self._signature(phone)
+                self.dirty.add(phone)
+        except Exception as e:
+            logger.error(f"Error appending progress for {phone}: {str(e)}")
+            return False
+
+        self._start_worker()
+        return True
+
+    def delete(self, phone):
+        """Drop every progress record of an account."""
+        # A compaction in flight would write the snapshot back
+        with self._file_lock(phone, name='compact.lock'), self._file_lock(phone), self.lock:
+            journal = self.journals.pop(phone, None)
+            if journal:
+                journal.close()
+            self.states.pop(phone, None)
+            self.record_counts.pop(phone, None)
+            self.signatures.pop(phone, None)
+            self.dirty.discard(phone)
+
+            for suffix in ('snapshot.json', 'journal.old', 'journal'):
+                path = self._path(phone, suffix)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _start_worker(self):
+        """Start the background fsync and compaction thread on first use."""
+        if self.worker is None:
+            self.worker = threading.Thread(target=self._run_worker, name='progress-store', daemon=True)
+            self.worker.start()
+
+    def _run_worker(self):
+        while True:
+            time.sleep(PROGRESS_FSYNC_INTERVAL)
+            try:
+                self.sync()
+                for phone in [phone for phone, count in list(self.record_counts.items()) if count >= PROGRESS_COMPACT_EVERY]:
+                    self.compact(phone)
+            except Exception as e:
+                logger.error(f"Error in progress store worker: {str(e)}")
+
+    def sync(self):
+        """Fsync every journal that has new records."""
+        with self.lock:
+            for phone in self.dirty:
+                if phone in self.journals:
+                    self.journals[phone].sync()
+            self.dirty.clear()
+
+    def compact(self, phone):
+        """Fold an account's journal into its snapshot.
+
+        The live journal is set aside under the locks and new appends go to
+        a fresh one, so writers in any process are only held up for a
+        rename. A separate lock file keeps two processes from compacting
+        the same account at once.
+        """
+        old_path = self._path(phone, 'journal.old')
+        with self._file_lock(phone, name='compact.lock'):
+            with self._file_lock(phone), self.lock:
+                if phone not in self.states:
+                    return
+                state = {key: dict(progress) for key, progress in self._load(phone).items()}
+                journal = self.journals[phone]
+                journal.sync()
+                journal.close()
+                if os.path.exists(journal.path):
+                    os.replace(journal.path, old_path)
+                self.record_counts[phone] = 0
+
+            # Write the snapshot atomically, then drop the records it covers.
+            # Readers meanwhile replay the set-aside journal on the old snapshot.
+            snapshot_path = self._path(phone, 'snapshot.json')
+            tmp_path = snapshot_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, snapshot_path)
+            if os.path.exists(old_path):
+                os.remove(old_path)
+
+        logger.info(f"Compacted progress journal for {phone}")
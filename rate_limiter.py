@@ -0,0 +1,133 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from metrics import registry, FLOOD_WAITS, FLOOD_WAIT_SECONDS, RATE_LIMIT_SLEEP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Rates are in requests per second. The initial rate matches the old fixed
+# 3 second sleep; the limiter then probes upwards while Telegram stays quiet.
+INITIAL_RATE = float(os.environ.get("RATE_LIMIT_INITIAL", 1 / 3))
+MIN_RATE = float(os.environ.get("RATE_LIMIT_MIN", 1 / 60))
+MAX_RATE = float(os.environ.get("RATE_LIMIT_MAX", 1.0))
+INCREASE_STEP = float(os.environ.get("RATE_LIMIT_INCREASE", 0.02))
+DECREASE_FACTOR = float(os.environ.get("RATE_LIMIT_DECREASE", 0.5))
+
+
+class TokenBucket:
+    """A token bucket whose refill rate is tuned with AIMD."""
+
+    def __init__(self, rate=INITIAL_RATE, min_rate=MIN_RATE, max_rate=MAX_RATE, capacity=1):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.flood_waits = 0
+
+    def _refill(self, now):
+        """Add the tokens earned since the last update."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now):
+        """Take a token and return how long the caller must wait for it.
+
+        The balance may go negative, which queues callers in arrival order.
+        """
+        self._refill(now)
+        self.tokens -= 1
+        wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def increase(self):
+        """Additive increase after a request that went through."""
+        self.rate = min(self.rate + INCREASE_STEP, self.max_rate)
+
+    def decrease(self, now, seconds=0):
+        """Multiplicative decrease, and hold all requests for the flood wait."""
+        self._refill(now)
+        self.rate = max(self.rate * DECREASE_FACTOR, self.min_rate)
+        self.tokens = min(self.tokens, 0)
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.flood_waits += 1
+
+
+class RateLimiter:
+    """Shared limiter with one token bucket per account and per destination chat.
+
+    A send must hold a token from both its account bucket and its chat
+    bucket. Buckets are guarded by a thread lock so forwarders running on
+    different event loops can share one limiter.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def _bucket(self, kind, key):
+        """Get or create the bucket for an account or a chat."""
+        bucket_key = (kind, str(key))
+        if bucket_key not in self.buckets:
+            self.buckets[bucket_key] = TokenBucket()
+        return self.buckets[bucket_key]
+
+    def _buckets(self, account, chat):
+        buckets = [self._bucket('account', account)]
+        if chat is not None:
+            buckets.append(self._bucket('chat', chat))
+        return buckets
+
+    async def acquire(self, account, chat=None):
+        """Wait until both the account and the chat may send another request."""
+        with self.lock:
+            now = time.monotonic()
+            wait = max(bucket.reserve(now) for bucket in self._buckets(account, chat))
+
+        if wait > 0:
+            RATE_LIMIT_SLEEP_SECONDS.inc(wait, account=account)
+            await asyncio.sleep(wait)
+
+    def on_success(self, account, chat=None):
+        """Raise the rate slowly after a request that was not throttled."""
+        with self.lock:
+            for bucket in self._buckets(account, chat):
+                bucket.increase()
+
+    def on_flood(self, account, chat=None, seconds=0):
+        """Cut the rate sharply after a FloodWait and block for its duration."""
+        with self.lock:
+            now = time.monotonic()
+            for bucket in self._buckets(account, chat):
+                bucket.decrease(now, seconds)
+
+        FLOOD_WAITS.inc(account=account)
+        FLOOD_WAIT_SECONDS.inc(seconds, account=account)
+        logger.warning(f"Flood wait of {seconds}s for account {account}, chat {chat}; backing off")
+
+    def get_rates(self):
+        """Get the current rate of every bucket for monitoring."""
+        with self.lock:
+            now = time.monotonic()
+            return {
+                f"{kind}:{key}": {
+                    'rate': round(bucket.rate, 4),
+                    'blocked_for': round(max(bucket.blocked_until - now, 0), 1),
+                    'flood_waits': bucket.flood_waits
+                }
+                for (kind, key), bucket in self.buckets.items()
+            }
+
+
+# The limiter shared by every send path in this process
+limiter = RateLimiter()
+
+# Current rates are read from the limiter only when /metrics is scraped
+registry.gauge('rate_limiter_requests_per_second', 'Current send rate of each limiter bucket.', ('scope', 'key'),
+               callback=lambda: {tuple(name.split(':', 1)): bucket['rate'] for name, bucket in limiter.get_rates().items()})
+registry.gauge('rate_limiter_blocked_seconds', 'Seconds a bucket stays blocked by a FloodWait.', ('scope', 'key'),
+               callback=lambda: {tuple(name.split(':', 1)): bucket['blocked_for'] for name, bucket in limiter.get_rates().items()})
@@ -0,0 +1,244 @@
+import os
+import json
+import socket
+import logging
+import threading
+import socketserver
+from scheduler import QueueFull, JobConflict
+
+logger = logging.getLogger(__name__)
+
+# Where the forwarding daemon listens; web workers use it when FORWARDER_SOCKET is set
+DEFAULT_SOCKET = 'data/forwarder.sock'
+
+# Seconds a call may take before the web worker gives up on the daemon
+RPC_TIMEOUT = float(os.environ.get("RPC_TIMEOUT", 60))
+
+# How often a progress stream proves it is alive when there are no events
+RPC_HEARTBEAT = 5
+
+# BotManager methods the web app may call on the daemon
+RPC_METHODS = (
+    'initialize_bot', 'submit_code', 'logout_user', 'get_user_data',
+    'add_source', 'add_destination', 'delete_source', 'delete_destination',
+    'start_bulk_import', 'get_bulk_import', 'set_last_message',
+    'start_forwarding', 'start_fan_out', 'cancel_forwarding', 'get_forwarding_status',
+    'list_jobs', 'find_jobs', 'get_job', 'cancel_job', 'pause_job', 'resume_job',
+    'get_queue_depth', 'get_pool_metrics', 'render_metrics',
+    'get_bot_status', 'set_bot_running'
+)
+
+# BotManager methods whose subscription turns the connection into an event stream
+RPC_STREAMS = ('listen_progress', 'listen_bot_status')
+
+# Exceptions that keep their type across the socket
+RPC_EXCEPTIONS = {'QueueFull': QueueFull, 'JobConflict': JobConflict}
+
+
+class RPCError(Exception):
+    """Raised in the web worker when the daemon call failed."""
+
+
+def _encode(value):
+    """Make a result JSON-friendly; jobs travel as their to_dict() view."""
+    if hasattr(value, 'to_dict'):
+        return {'__job__': value.to_dict()}
+    return value
+
+
+class LineSocket:
+    """Newline-delimited JSON messages over a stream socket."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = b''
+
+    def send(self, message):
+        self.sock.sendall(json.dumps(message, default=str).encode('utf-8') + b'\n')
+
+    def receive(self, timeout=None):
+        """Read the next message; returns None on timeout, raises ConnectionError if closed."""
+        self.sock.settimeout(timeout)
+        while b'\n' not in self.buffer:
+            try:
+                chunk = self.sock.recv(65536)
+            except socket.timeout:
+                return None
+            if not chunk:
+                raise ConnectionError("Forwarding daemon closed the connection")
+            self.buffer += chunk
+
+        line, self.buffer = self.buffer.split(b'\n', 1)
+        return json.loads(line)
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RPCHandler(socketserver.BaseRequestHandler):
+    """Serve calls from one web worker connection until it closes."""
+
+    def handle(self):
+        conn = LineSocket(self.request)
+        while True:
+            try:
+                request = conn.receive()
+            except (ConnectionError, OSError):
+                return
+
+            if request.get('method') in RPC_STREAMS:
+                # The connection becomes a one-way event stream
+                self._stream(conn, request['method'], request.get('args', []))
+                return
+
+            conn.send(self.server.dispatch(request.get('method'), request.get('args', []), request.get('kwargs', {})))
+
+    def _stream(self, conn, method, args):
+        subscription = getattr(self.server.bot_manager, method)(*args)
+        try:
+            while True:
+                event = subscription.get(timeout=RPC_HEARTBEAT)
+                conn.send({'event': event} if event is not None else {'heartbeat': True})
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            subscription.close()
+
+
+class RPCServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Expose a BotManager to web workers over a Unix socket."""
+
+    daemon_threads = True
+
+    def __init__(self, path, bot_manager):
+        self.bot_manager = bot_manager
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if os.path.exists(path):
+            os.remove(path)
+        super().__init__(path, RPCHandler)
+        # Only processes of the same user may drive the daemon
+        os.chmod(path, 0o600)
+
+    def dispatch(self, method, args, kwargs):
+        if method not in RPC_METHODS:
+            return {'error': f"Unknown method {method}", 'type': 'RPCError'}
+        try:
+            return {'result': _encode(getattr(self.bot_manager, method)(*args, **kwargs))}
+        except Exception as e:
+            if type(e).__name__ not in RPC_EXCEPTIONS:
+                logger.error(f"Error in RPC call {method}: {str(e)}")
+            return {'error': str(e), 'type': type(e).__name__, 'job_id': getattr(e, 'job_id', None)}
+
+
+class RemoteJob:
+    """A job as returned by the daemon, with the attributes the web app reads."""
+
+    def __init__(self, data):
+        self.data = data
+        self.id = data['id']
+        self.phone = data['phone']
+        self.status = data['status']
+
+    def to_dict(self):
+        return self.data
+
+
+class RemoteSubscription:
+    """Events streamed by the daemon, read like a progress_bus Subscription."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def get(self, timeout=None):
+        """Wait for the next event; returns None on timeout or heartbeat."""
+        message = self.conn.receive(timeout)
+        if message is None:
+            return None
+        return message.get('event')
+
+    def close(self):
+        self.conn.close()
+
+
+class RemoteBotManager:
+    """Stand-in for BotManager that forwards every call to the daemon.
+
+    Each web worker thread keeps its own connection, reconnecting once if
+    the daemon was restarted in the meantime.
+    """
+
+    def __init__(self, path, timeout=RPC_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError as e:
+            sock.close()
+            raise RPCError(f"Forwarding daemon is not reachable at {self.path}: {str(e)}")
+        return LineSocket(sock)
+
+    def _drop(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+        self.local.conn = None
+
+    def _call(self, method, *args, **kwargs):
+        request = {'method': method, 'args': list(args), 'kwargs': kwargs}
+        conn = getattr(self.local, 'conn', None)
+        try:
+            if conn is None:
+                raise ConnectionError("Not connected")
+            conn.send(request)
+        except OSError:
+            # The daemon was restarted since this connection was opened; nothing was sent
+            self._drop()
+            conn = self.local.conn = self._connect()
+            conn.send(request)
+
+        try:
+            response = conn.receive(self.timeout)
+        except OSError as e:
+            self._drop()
+            raise RPCError(f"Lost the forwarding daemon during {method}: {str(e)}")
+        if response is None:
+            # A late answer must not be read as the reply to the next call
+            self._drop()
+            raise RPCError(f"Forwarding daemon did not answer {method} within {self.timeout}s")
+
+        if 'error' in response:
+            if response.get('type') == 'JobConflict':
+                raise JobConflict(response['error'], response.get('job_id'))
+            raise RPC_EXCEPTIONS.get(response.get('type'), RPCError)(response['error'])
+
+        result = response.get('result')
+        if isinstance(result, dict) and '__job__' in result:
+            return RemoteJob(result['__job__'])
+        return result
+
+    def __getattr__(self, name):
+        if name not in RPC_METHODS:
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self._call(name, *args, **kwargs)
+
+    def _listen(self, method, *args):
+        """Open a dedicated connection streaming one of the daemon's subscriptions."""
+        conn = self._connect()
+        conn.send({'method': method, 'args': list(args)})
+        return RemoteSubscription(conn)
+
+    def listen_progress(self, phone=None):
+        """Stream the daemon's progress events."""
+        return self._listen('listen_progress', phone)
+
+    def listen_bot_status(self):
+        """Stream the daemon's bot status changes."""
+        return self._listen('listen_bot_status')
@@ -0,0 +1,134 @@
+import os
+import asyncio
+import logging
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Threads that run blocking storage I/O for coroutines, so file and
+# database access never stalls an event loop
+STORAGE_IO_WORKERS = int(os.environ.get("STORAGE_IO_WORKERS", 4))
+
+# Threads that run blocking calls which wait on the forwarding runtime, such
+# as resolving a chat; kept apart from the storage threads those calls need
+BLOCKING_CALL_WORKERS = int(os.environ.get("BLOCKING_CALL_WORKERS", 16))
+
+
+class ForwardingRuntime:
+    """A background thread that owns one long-lived event loop.
+
+    Telegram clients are connected on this loop and every forwarding job
+    runs on it as a task, so jobs for many accounts share one thread
+    instead of each getting its own thread and loop.
+    """
+
+    def __init__(self, name='forwarding-runtime'):
+        self.name = name
+        self.loop = None
+        self.thread = None
+        self.lock = threading.Lock()
+        self.started = threading.Event()
+
+    def start(self):
+        """Start the runtime thread if it isn't running yet."""
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+
+            self.started.clear()
+            self.thread = threading.Thread(target=self._run_loop, name=self.name, daemon=True)
+            self.thread.start()
+
+        self.started.wait()
+
+    def _run_loop(self):
+        """Run the event loop until stop() is called."""
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.started.set()
+
+        try:
+            self.loop.run_forever()
+        finally:
+            # Cancel whatever is still pending so it can clean up
+            pending = asyncio.all_tasks(self.loop)
+            for task in pending:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self.loop.close()
+            logger.info("Forwarding runtime stopped")
+
+    def submit(self, coro):
+        """Schedule a coroutine on the runtime loop.
+
+        Returns a concurrent.futures.Future; cancelling it cancels the task.
+        """
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the runtime loop and wait for its result."""
+        if self.in_runtime():
+            raise RuntimeError("run() would deadlock when called from the runtime loop; await the coroutine instead")
+        return self.submit(coro).result(timeout)
+
+    def in_runtime(self):
+        """Check if the caller is running on the runtime thread."""
+        return self.thread is not None and threading.current_thread() is self.thread
+
+    def stop(self, timeout=10):
+        """Stop the loop, cancelling pending tasks."""
+        with self.lock:
+            if not self.thread or not self.thread.is_alive():
+                return
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            thread = self.thread
+
+        thread.join(timeout)
+
+
+# The runtime shared by every Forwarder and client in this process
+runtime = ForwardingRuntime()
+
+
+_io_executor = None
+_io_executor_lock = threading.Lock()
+
+
+def _get_io_executor():
+    """Get the bounded executor shared by every storage backend."""
+    global _io_executor
+    with _io_executor_lock:
+        if _io_executor is None:
+            _io_executor = ThreadPoolExecutor(max_workers=STORAGE_IO_WORKERS, thread_name_prefix='storage-io')
+        return _io_executor
+
+
+async def run_io(func, *args):
+    """Run a blocking storage call on the I/O executor and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_io_executor(), functools.partial(func, *args))
+
+
+_blocking_executor = None
+
+
+def _get_blocking_executor():
+    """Get the executor for calls that block on the runtime, never the storage one."""
+    global _blocking_executor
+    with _io_executor_lock:
+        if _blocking_executor is None:
+            _blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_CALL_WORKERS, thread_name_prefix='blocking-call')
+        return _blocking_executor
+
+
+async def run_blocking(func, *args):
+    """Run a blocking call that may wait on the runtime or on storage I/O, and await its result.
+
+    Such a call must not occupy a storage thread: the coroutines it waits
+    for need those threads themselves.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_blocking_executor(), functools.partial(func, *args))
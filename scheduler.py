@@ -0,0 +1,300 @@
+import os
+import time
+import uuid
+import heapq
+import logging
+import itertools
+import threading
+import concurrent.futures
+from collections import deque
+from progress_bus import progress_bus
+
+logger = logging.getLogger(__name__)
+
+# How many jobs one account may run at the same time on its client
+MAX_JOBS_PER_ACCOUNT = int(os.environ.get("MAX_JOBS_PER_ACCOUNT", 3))
+
+# How many jobs may wait across all accounts before new ones are refused
+MAX_QUEUED_JOBS = int(os.environ.get("MAX_QUEUED_JOBS", 100))
+
+# How many finished jobs stay in memory; older ones are only in the job store
+MAX_FINISHED_JOBS = int(os.environ.get("MAX_FINISHED_JOBS", 200))
+
+# Seconds a shutdown waits for running jobs to stop after their current batch
+SHUTDOWN_TIMEOUT = float(os.environ.get("SHUTDOWN_TIMEOUT", 10))
+
+# Interrupted jobs are finished in this process and resumed by the next one
+FINISHED_STATUSES = ('completed', 'cancelled', 'failed', 'interrupted')
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at its limit."""
+
+
+class JobConflict(Exception):
+    """Raised when a job would forward a pair that an active job already forwards."""
+
+    def __init__(self, message, job_id=None):
+        super().__init__(message)
+        self.job_id = job_id
+
+
+class Job:
+    """A forwarding job queued or running for one account."""
+
+    def __init__(self, phone, kind, forwarder, coro_factory, priority=0, details=None, keys=()):
+        self.id = uuid.uuid4().hex[:12]
+        self.phone = phone
+        self.kind = kind
+        self.forwarder = forwarder
+        self.forwarder.job_id = self.id
+        self.coro_factory = coro_factory  # Builds the job's coroutine when it starts
+        self.priority = priority
+        self.details = details or {}
+        self.keys = frozenset(keys)  # Checkpoint keys (source_destination) the job writes
+        self.status = 'queued'
+        self.future = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        """Get a JSON-friendly view of the job and its progress."""
+        progress = self.forwarder.progress.copy()
+        percent = 0
+        if progress['total_messages'] > 0:
+            percent = (progress['forwarded_messages'] / progress['total_messages']) * 100
+
+        return {
+            'id': self.id,
+            'phone': self.phone,
+            'kind': self.kind,
+            'priority': self.priority,
+            'status': self.status,
+            'details': self.details,
+            'total_messages': progress['total_messages'],
+            'forwarded_messages': progress['forwarded_messages'],
+            'last_forwarded_id': progress['last_forwarded_id'],
+            'progress': round(percent, 2),
+            'error': progress.get('error'),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class JobScheduler:
+    """Queue forwarding jobs per account and run a bounded number at once.
+
+    Jobs wait in a per-account priority queue (higher priority first, then
+    first come first served) and are started on the shared runtime as soon
+    as the account has a free slot. At most max_queued jobs may wait across
+    all accounts; submitting more raises QueueFull instead of piling up work.
+    Every state change is written to the job store, if one is given, and
+    only the max_finished most recently finished jobs are kept in memory.
+    """
+
+    def __init__(self, runtime, max_concurrent=MAX_JOBS_PER_ACCOUNT, max_queued=MAX_QUEUED_JOBS, store=None,
+                 max_finished=MAX_FINISHED_JOBS):
+        self.runtime = runtime
+        self.store = store
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self.lock = threading.Lock()
+        self.jobs = {}  # Maps job IDs to jobs
+        self.queues = {}  # Maps phone numbers to heaps of queued jobs
+        self.running = {}  # Maps phone numbers to the number of running jobs
+        self.queued = 0  # Jobs waiting for a slot, across all accounts
+        self.finished = deque()  # IDs of finished jobs still in self.jobs, oldest first
+        self.counter = itertools.count()
+        self.closed = False  # Set by shutdown(); no more jobs are started
+        
+        # Jobs of a previous process cannot be controlled from this one
+        if self.store is not None:
+            self.store.mark_interrupted()
+
+    def submit(self, phone, kind, forwarder, coro_factory, priority=0, details=None, keys=()):
+        """Queue a job and start it if the account has a free slot.
+
+        Raises QueueFull if max_queued jobs are already waiting, and
+        JobConflict if an active job of the account shares one of ``keys``;
+        two jobs on one checkpoint would forward the history twice.
+        """
+        keys = frozenset(keys)
+        with self.lock:
+            for other in self.jobs.values():
+                if other.phone == phone and other.status not in FINISHED_STATUSES and other.keys & keys:
+                    raise JobConflict(f"Job {other.id} is already forwarding this source to this destination", other.id)
+
+            if self.queued >= self.max_queued:
+                raise QueueFull(f"Job queue is full ({self.max_queued} jobs waiting)")
+
+            job = Job(phone, kind, forwarder, coro_factory, priority, details, keys)
+            self.jobs[job.id] = job
+            self.queued += 1
+            heapq.heappush(self.queues.setdefault(phone, []), (-priority, next(self.counter), job))
+
+        logger.info(f"Queued {kind} job {job.id} for {phone} with priority {priority}")
+        self._persist(job)
+        self._dispatch(phone)
+        return job
+
+    def _dispatch(self, phone):
+        """Start queued jobs while the account has free slots."""
+        to_start = []
+        with self.lock:
+            if self.closed:
+                return
+            queue = self.queues.get(phone, [])
+            while queue and self.running.get(phone, 0) < self.max_concurrent:
+                _, _, job = heapq.heappop(queue)
+                if job.status != 'queued':
+                    continue
+                self.queued -= 1
+                job.status = 'running'
+                job.started_at = time.time()
+                self.running[phone] = self.running.get(phone, 0) + 1
+                to_start.append(job)
+
+        for job in to_start:
+            self._persist(job)
+            job.future = self.runtime.submit(job.coro_factory())
+            job.future.add_done_callback(lambda f, job=job: self._on_done(job))
+
+    def _on_done(self, job):
+        """Record how a job ended and hand its slot to the next one."""
+        with self.lock:
+            self.running[job.phone] -= 1
+            job.finished_at = time.time()
+            status = job.forwarder.progress['status']
+            job.status = status if status in FINISHED_STATUSES else 'completed'
+            if job.future.cancelled():
+                job.status = job.forwarder.stopped_status()
+            elif job.future.exception() is not None:
+                job.status = 'failed'
+                logger.error(f"Job {job.id} for {job.phone} failed: {str(job.future.exception())}")
+
+        self._persist(job)
+        self._publish(job)
+        self._retire(job)
+        self._dispatch(job.phone)
+
+    def cancel(self, job_id):
+        """Cancel a job; queued jobs are dropped, running ones stop after the current batch."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if not job or job.status in FINISHED_STATUSES:
+                return False
+
+            if job.status == 'queued':
+                self.queued -= 1
+                job.status = 'cancelled'
+                job.finished_at = time.time()
+                queued = True
+            else:
+                queued = False
+
+        if queued:
+            self._persist(job)
+            self._publish(job)
+            self._retire(job)
+            return True
+
+        job.forwarder.cancel_forwarding()
+        return True
+
+    def pause(self, job_id):
+        """Pause a running job before its next request; it keeps its slot."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if not job or job.status != 'running':
+                return False
+            job.status = 'paused'
+
+        job.forwarder.pause_forwarding()
+        self._persist(job)
+        return True
+
+    def resume(self, job_id):
+        """Resume a paused job."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if not job or job.status != 'paused':
+                return False
+            job.status = 'running'
+
+        job.forwarder.resume_forwarding()
+        self._persist(job)
+        return True
+
+    def shutdown(self, timeout=SHUTDOWN_TIMEOUT):
+        """Stop every job so the next process resumes it.
+
+        Running and paused jobs are interrupted after their current batch;
+        those still running after ``timeout`` seconds are cancelled, which
+        records them as interrupted too. Queued jobs are not started.
+        """
+        with self.lock:
+            self.closed = True
+            running = [job for job in self.jobs.values() if job.status in ('running', 'paused')]
+
+        for job in running:
+            job.forwarder.interrupt()
+        futures = [job.future for job in running if job.future is not None]
+        _, pending = concurrent.futures.wait(futures, timeout)
+        for future in pending:
+            future.cancel()
+        if running:
+            logger.info(f"Interrupted {len(running)} jobs ({len(pending)} cancelled) for shutdown")
+
+    def _persist(self, job):
+        """Write a job's current state to the store; one indexed row, so cheap enough for any thread."""
+        if self.store is None:
+            return
+        try:
+            self.store.save(job.to_dict())
+        except Exception as e:
+            logger.error(f"Error saving job {job.id}: {str(e)}")
+
+    def _retire(self, job):
+        """Forget the oldest finished jobs once the store has their final state."""
+        with self.lock:
+            self.finished.append(job.id)
+            while len(self.finished) > self.max_finished:
+                self.jobs.pop(self.finished.popleft(), None)
+
+    def _publish(self, job):
+        """Tell progress listeners how a job ended."""
+        progress_bus.publish(dict(job.forwarder.progress, phone=job.phone, job_id=job.id, status=job.status, timestamp=time.time()), force=True)
+
+    def queue_depth(self):
+        """Get how many jobs are waiting and running, against the queue limit."""
+        with self.lock:
+            return {
+                'queued': self.queued,
+                'running': sum(self.running.values()),
+                'max_queued': self.max_queued,
+                'max_jobs_per_account': self.max_concurrent
+            }
+
+    def status_counts(self):
+        """Get how many jobs are in each status."""
+        counts = {}
+        with self.lock:
+            for job in self.jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    def get_job(self, job_id):
+        return self.jobs.get(job_id)
+
+    def list_jobs(self, phone=None):
+        """Get all jobs, optionally for one account, newest first."""
+        with self.lock:
+            jobs = [job for job in self.jobs.values() if phone is None or job.phone == phone]
+        return sorted(jobs, key=lambda job: job.created_at, reverse=True)
+
+    def active_jobs(self, phone):
+        """Get the queued and running jobs of an account."""
+        return [job for job in self.list_jobs(phone) if job.status not in FINISHED_STATUSES]
@@ -0,0 +1,215 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+from storage import AsyncStorageMixin
+
+logger = logging.getLogger(__name__)
+
+# Keys of the user document that live in their own tables
+COLLECTION_TABLES = {
+    'sources': 'sources',
+    'destinations': 'destinations',
+    'forwarding_progress': 'forwarding_progress'
+}
+
+
+class SQLiteStorage(AsyncStorageMixin):
+    """SQLite (WAL mode) backend with the same API as Storage.
+
+    Sources, destinations and forwarding progress are rows in their own
+    tables keyed by phone, so adding a source or saving progress touches
+    one row instead of rewriting the whole user document.
+    """
+
+    def __init__(self, data_dir='data', db_name='storage.db'):
+        self.data_dir = data_dir
+        self.ensure_data_dir()
+        self.db_path = os.path.join(data_dir, db_name)
+        self.local = threading.local()
+        self._init_tables()
+
+    def ensure_data_dir(self):
+        """Ensure the data directory exists."""
+        if not os.path.exists(self.data_dir):
+            os.makedirs(self.data_dir)
+
+    def _connect(self):
+        """Get this thread's connection, opening it on first use."""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def _init_tables(self):
+        """Create the tables if they don't exist."""
+        conn = self._connect()
+        with conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS users (
+                    phone TEXT PRIMARY KEY,
+                    api_id TEXT,
+                    api_hash TEXT,
+                    extra TEXT NOT NULL DEFAULT '{}'
+                )
+            ''')
+            for table in COLLECTION_TABLES.values():
+                # The (phone, key) primary key doubles as the lookup index
+                conn.execute(f'''
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        phone TEXT NOT NULL,
+                        key TEXT NOT NULL,
+                        data TEXT NOT NULL,
+                        PRIMARY KEY (phone, key)
+                    )
+                ''')
+
+    def user_exists(self, phone):
+        """Check if a user exists in storage."""
+        row = self._connect().execute('SELECT 1 FROM users WHERE phone = ?', (phone,)).fetchone()
+        return row is not None
+
+    def list_users(self):
+        """Get the phone numbers of every stored user, sorted."""
+        return [row[0] for row in self._connect().execute('SELECT phone FROM users ORDER BY phone')]
+
+    def create_user(self, phone, api_id, api_hash):
+        """Create a new user in storage."""
+        user_data = {
+            'phone': phone,
+            'api_id': api_id,
+            'api_hash': api_hash,
+            'sources': {},
+            'destinations': {},
+            'forwarding_progress': {}
+        }
+
+        self.save_user_data(phone, user_data)
+
+        return user_data
+
+    def get_user_data(self, phone):
+        """Get a user's data from storage."""
+        try:
+            conn = self._connect()
+            row = conn.execute('SELECT api_id, api_hash, extra FROM users WHERE phone = ?', (phone,)).fetchone()
+            if row is None:
+                return None
+
+            user_data = json.loads(row[2])
+            user_data.update({'phone': phone, 'api_id': row[0], 'api_hash': row[1]})
+
+            for field, table in COLLECTION_TABLES.items():
+                rows = conn.execute(f'SELECT key, data FROM {table} WHERE phone = ?', (phone,))
+                user_data[field] = {key: json.loads(data) for key, data in rows}
+
+            return user_data
+        except Exception as e:
+            logger.error(f"Error reading user data for {phone}: {str(e)}")
+            return None
+
+    def _write_fields(self, conn, phone, fields):
+        """Write top-level fields of a user document inside a transaction."""
+        extra = {}
+        row = conn.execute('SELECT extra FROM users WHERE phone = ?', (phone,)).fetchone()
+        if row is not None:
+            extra = json.loads(row[0])
+
+        for key, value in fields.items():
+            if key in COLLECTION_TABLES:
+                # A collection is replaced as a whole
+                table = COLLECTION_TABLES[key]
+                conn.execute(f'DELETE FROM {table} WHERE phone = ?', (phone,))
+                conn.executemany(
+                    f'INSERT INTO {table} (phone, key, data) VALUES (?, ?, ?)',
+                    [(phone, str(item_key), json.dumps(item)) for item_key, item in (value or {}).items()]
+                )
+            elif key not in ('phone', 'api_id', 'api_hash'):
+                extra[key] = value
+
+        conn.execute('''
+            INSERT INTO users (phone, api_id, api_hash, extra) VALUES (?, ?, ?, ?)
+            ON CONFLICT (phone) DO UPDATE SET
+                api_id = COALESCE(excluded.api_id, users.api_id),
+                api_hash = COALESCE(excluded.api_hash, users.api_hash),
+                extra = excluded.extra
+        ''', (phone, fields.get('api_id'), fields.get('api_hash'), json.dumps(extra)))
+
+    def save_user_data(self, phone, user_data):
+        """Save a user's data to storage."""
+        try:
+            conn = self._connect()
+            with conn:
+                self._write_fields(conn, phone, user_data)
+            return True
+        except Exception as e:
+            logger.error(f"Error saving user data for {phone}: {str(e)}")
+            return False
+
+    def update_user(self, phone, updates):
+        """Update a user's data in storage."""
+        if not self.user_exists(phone):
+            return False
+
+        return self.save_user_data(phone, updates)
+
+    def _upsert(self, phone, table, items):
+        """Insert or replace rows of one of the collection tables."""
+        if not self.user_exists(phone):
+            return False
+
+        try:
+            conn = self._connect()
+            with conn:
+                conn.executemany(f'''
+                    INSERT INTO {table} (phone, key, data) VALUES (?, ?, ?)
+                    ON CONFLICT (phone, key) DO UPDATE SET data = excluded.data
+                ''', [(phone, str(key), json.dumps(item)) for key, item in items.items()])
+            return True
+        except Exception as e:
+            logger.error(f"Error writing {table} for {phone}: {str(e)}")
+            return False
+
+    def update_progress(self, phone, progress):
+        """Upsert forwarding progress entries, one row per task."""
+        return self._upsert(phone, 'forwarding_progress', progress)
+
+    def add_source(self, phone, source):
+        """Add a source to a user's data."""
+        return self._upsert(phone, 'sources', {source['id']: source})
+
+    def add_destination(self, phone, destination):
+        """Add a destination to a user's data."""
+        return self._upsert(phone, 'destinations', {destination['id']: destination})
+
+    def add_sources(self, phone, sources):
+        """Add several sources in one transaction."""
+        return self._upsert(phone, 'sources', {source['id']: source for source in sources})
+
+    def add_destinations(self, phone, destinations):
+        """Add several destinations in one transaction."""
+        return self._upsert(phone, 'destinations', {destination['id']: destination for destination in destinations})
+
+    def close(self):
+        """Close this thread's connection."""
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    def delete_user(self, phone):
+        """Delete a user's data from storage."""
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute('DELETE FROM users WHERE phone = ?', (phone,))
+                for table in COLLECTION_TABLES.values():
+                    conn.execute(f'DELETE FROM {table} WHERE phone = ?', (phone,))
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting user data for {phone}: {str(e)}")
+            return False
@@ -1,13 +1,107 @@
 import os
 import json
 import logging
+import threading
+from collections import OrderedDict
+from progress_store import ProgressStore
+from runtime import run_io
 
 logger = logging.getLogger(__name__)
 
-class Storage:
-    def __init__(self, data_dir='data'):
+# Which storage backend to use: "json" (one file per user) or "sqlite"
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "json")
+
+# How many parsed user documents to keep in memory
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 256))
+
+def _copy_document(value):
+    """Copy a JSON document; much cheaper than copy.deepcopy for plain dicts and lists."""
+    if type(value) is dict:
+        return {key: _copy_document(item) for key, item in value.items()}
+    if type(value) is list:
+        return [_copy_document(item) for item in value]
+    return value
+
+class AsyncStorageMixin:
+    """Awaitable versions of the storage API for use inside event loops.
+
+    Each method runs its blocking counterpart on the shared storage I/O
+    executor, so callers on an event loop only wait for the result.
+    """
+    
+    async def auser_exists(self, phone):
+        return await run_io(self.user_exists, phone)
+    
+    async def acreate_user(self, phone, api_id, api_hash):
+        return await run_io(self.create_user, phone, api_id, api_hash)
+    
+    async def aget_user_data(self, phone):
+        return await run_io(self.get_user_data, phone)
+    
+    async def asave_user_data(self, phone, user_data):
+        return await run_io(self.save_user_data, phone, user_data)
+    
+    async def aupdate_user(self, phone, updates):
+        return await run_io(self.update_user, phone, updates)
+    
+    async def aupdate_progress(self, phone, progress):
+        return await run_io(self.update_progress, phone, progress)
+    
+    async def aadd_source(self, phone, source):
+        return await run_io(self.add_source, phone, source)
+    
+    async def aadd_destination(self, phone, destination):
+        return await run_io(self.add_destination, phone, destination)
+    
+    async def aadd_sources(self, phone, sources):
+        return await run_io(self.add_sources, phone, sources)
+    
+    async def aadd_destinations(self, phone, destinations):
+        return await run_io(self.add_destinations, phone, destinations)
+    
+    async def adelete_user(self, phone):
+        return await run_io(self.delete_user, phone)
+
+class Storage(AsyncStorageMixin):
+    def __init__(self, data_dir='data', cache_size=USER_CACHE_SIZE):
         self.data_dir = data_dir
         self.ensure_data_dir()
+        
+        # LRU cache of parsed user documents: phone -> (mtime_ns, size, data)
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.cache_lock = threading.Lock()
+        
+        # Forwarding progress is written far more often than the rest of the
+        # document, so it lives in its own log-structured store
+        self.progress_store = ProgressStore(data_dir)
+    
+    def _file_version(self, file_path):
+        """Get the (mtime, size) pair that identifies a file's current contents."""
+        stat = os.stat(file_path)
+        return stat.st_mtime_ns, stat.st_size
+    
+    def _cache_get(self, phone, version):
+        """Get a cached document if it still matches the file on disk."""
+        with self.cache_lock:
+            entry = self.cache.get(phone)
+            if entry is None or entry[:2] != version:
+                return None
+            
+            self.cache.move_to_end(phone)
+            return _copy_document(entry[2])
+    
+    def _cache_put(self, phone, version, user_data):
+        """Remember a document, evicting the least recently used one when full."""
+        with self.cache_lock:
+            self.cache[phone] = (*version, _copy_document(user_data))
+            self.cache.move_to_end(phone)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+    
+    def _cache_drop(self, phone):
+        with self.cache_lock:
+            self.cache.pop(phone, None)
     
     def ensure_data_dir(self):
         """Ensure the data directory exists."""
@@ -22,6 +116,10 @@ class Storage:
         """Check if a user exists in storage."""
         return os.path.exists(self.get_user_file_path(phone))
     
+    def list_users(self):
+        """Get the phone numbers of every stored user, sorted."""
+        return sorted(name[:-len('.json')] for name in os.listdir(self.data_dir) if name.endswith('.json'))
+    
     def create_user(self, phone, api_id, api_hash):
         """Create a new user in storage."""
         user_data = {
@@ -38,38 +136,86 @@ class Storage:
         return user_data
     
     def get_user_data(self, phone):
-        """Get a user's data from storage."""
+        """Get a user's data from storage, with its forwarding progress."""
+        user_data = self._read_document(phone)
+        
+        if user_data is None:
+            return None
+        
+        user_data['forwarding_progress'] = self.progress_store.get(phone)
+        return user_data
+    
+    def _read_document(self, phone):
+        """Read a user's document without its forwarding progress.
+
+        Parsed documents are cached; the file's mtime and size are checked on
+        every read so writes made by other processes are picked up.
+        """
         file_path = self.get_user_file_path(phone)
         
-        if not os.path.exists(file_path):
+        try:
+            version = self._file_version(file_path)
+        except FileNotFoundError:
+            self._cache_drop(phone)
             return None
         
+        cached = self._cache_get(phone, version)
+        if cached is not None:
+            return cached
+        
         try:
             with open(file_path, 'r') as f:
-                return json.load(f)
+                user_data = json.load(f)
+            
+            # Move progress kept in the document by older versions to the progress store
+            legacy_progress = user_data.get('forwarding_progress')
+            if legacy_progress:
+                stored = self.progress_store.get(phone)
+                self.progress_store.append(phone, {key: value for key, value in legacy_progress.items() if key not in stored})
+                user_data['forwarding_progress'] = {}
+                self.save_user_data(phone, user_data)
+                return user_data
+            
+            self._cache_put(phone, version, user_data)
+            return user_data
         except Exception as e:
             logger.error(f"Error reading user data for {phone}: {str(e)}")
             return None
     
     def save_user_data(self, phone, user_data):
-        """Save a user's data to storage."""
+        """Save a user's data to storage.
+
+        Forwarding progress is not written to the document; it is saved
+        through update_progress.
+        """
         file_path = self.get_user_file_path(phone)
+        user_data = dict(user_data, forwarding_progress={})
         
         try:
             with open(file_path, 'w') as f:
                 json.dump(user_data, f, indent=2)
+            
+            # Write through so the next read is served from memory
+            self._cache_put(phone, self._file_version(file_path), user_data)
             return True
         except Exception as e:
+            self._cache_drop(phone)
             logger.error(f"Error saving user data for {phone}: {str(e)}")
             return False
     
     def update_user(self, phone, updates):
         """Update a user's data in storage."""
-        user_data = self.get_user_data(phone)
+        user_data = self._read_document(phone)
         
         if not user_data:
             return False
         
+        updates = dict(updates)
+        if 'forwarding_progress' in updates:
+            self.progress_store.append(phone, updates.pop('forwarding_progress'))
+            if not updates:
+                return True
+        
         # Update the user data
         for key, value in updates.items():
             user_data[key] = value
@@ -77,9 +223,16 @@ class Storage:
         # Save the updated data
         return self.save_user_data(phone, user_data)
     
+    def update_progress(self, phone, progress):
+        """Record forwarding progress entries, keyed by task, as journal appends."""
+        if not self.user_exists(phone):
+            return False
+        
+        return self.progress_store.append(phone, progress)
+    
     def add_source(self, phone, source):
         """Add a source to a user's data."""
-        user_data = self.get_user_data(phone)
+        user_data = self._read_document(phone)
         
         if not user_data:
             return False
@@ -92,7 +245,7 @@ class Storage:
     
     def add_destination(self, phone, destination):
         """Add a destination to a user's data."""
-        user_data = self.get_user_data(phone)
+        user_data = self._read_document(phone)
         
         if not user_data:
             return False
@@ -103,9 +256,39 @@ class Storage:
         # Save the updated data
         return self.save_user_data(phone, user_data)
     
+    def add_sources(self, phone, sources):
+        """Add several sources with a single write."""
+        user_data = self._read_document(phone)
+        
+        if not user_data:
+            return False
+        
+        for source in sources:
+            user_data.setdefault('sources', {})[source['id']] = source
+        
+        return self.save_user_data(phone, user_data)
+    
+    def add_destinations(self, phone, destinations):
+        """Add several destinations with a single write."""
+        user_data = self._read_document(phone)
+        
+        if not user_data:
+            return False
+        
+        for destination in destinations:
+            user_data.setdefault('destinations', {})[destination['id']] = destination
+        
+        return self.save_user_data(phone, user_data)
+    
+    def close(self):
+        """Force pending progress records to disk."""
+        self.progress_store.sync()
+    
     def delete_user(self, phone):
         """Delete a user's data from storage."""
         file_path = self.get_user_file_path(phone)
+        self._cache_drop(phone)
+        self.progress_store.delete(phone)
         
         if not os.path.exists(file_path):
             return True
@@ -116,3 +299,12 @@ class Storage:
         except Exception as e:
             logger.error(f"Error deleting user data for {phone}: {str(e)}")
             return False
+
+
+def get_storage(data_dir='data'):
+    """Create the storage backend selected by STORAGE_BACKEND."""
+    if STORAGE_BACKEND == 'sqlite':
+        from sqlite_storage import SQLiteStorage
+        return SQLiteStorage(data_dir)
+    
+    return Storage(data_dir)
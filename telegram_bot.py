@@ -4,7 +4,7 @@ import asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
 from bot_manager import BotManager
-from storage import Storage
+from storage import get_storage
 
 # Enable logging
 logging.basicConfig(
@@ -15,7 +15,7 @@ logger = logging.getLogger(__name__)
 
 # Global variables
 bot_manager = BotManager()
-storage = Storage()
+storage = get_storage()
 user_states = {}  # To keep track of user states in the conversation
 
 # State constants
@@ -306,7 +306,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         
         if phone:
             try:
-                result = bot_manager.delete_source(phone, source_id)
+                result = await bot_manager.adelete_source(phone, source_id)
                 if result.get('success'):
                     await query.edit_message_text(
                         "✅ Source deleted successfully.",
@@ -334,7 +334,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         
         if phone:
             try:
-                result = bot_manager.delete_destination(phone, destination_id)
+                result = await bot_manager.adelete_destination(phone, destination_id)
                 if result.get('success'):
                     await query.edit_message_text(
                         "✅ Destination deleted successfully.",
@@ -362,7 +362,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     elif data == "logout":
         phone = sessions.get(user_id, {}).get('phone')
         if phone:
-            bot_manager.logout_user(phone)
+            await bot_manager.alogout_user(phone)
             if user_id in sessions:
                 del sessions[user_id]
             
@@ -432,7 +432,7 @@ async def show_sources_menu(user_id, query):
         )
         return
     
-    user_data = bot_manager.get_user_data(phone)
+    user_data = await bot_manager.aget_user_data(phone)
     sources = user_data.get('sources', {})
     
     if not sources:
@@ -485,7 +485,7 @@ async def show_destinations_menu(user_id, query):
         )
         return
     
-    user_data = bot_manager.get_user_data(phone)
+    user_data = await bot_manager.aget_user_data(phone)
     destinations = user_data.get('destinations', {})
     
     if not destinations:
@@ -538,7 +538,7 @@ async def show_forwarding_menu(user_id, query):
         )
         return
     
-    user_data = bot_manager.get_user_data(phone)
+    user_data = await bot_manager.aget_user_data(phone)
     sources = user_data.get('sources', {})
     
     if not sources:
@@ -586,7 +586,7 @@ async def show_destinations_for_forwarding(user_id, query):
         )
         return
     
-    user_data = bot_manager.get_user_data(phone)
+    user_data = await bot_manager.aget_user_data(phone)
     destinations = user_data.get('destinations', {})
     
     if not destinations:
@@ -644,7 +644,7 @@ async def show_status(user_id, query):
         return
     
     # Get source and destination names
-    user_data = bot_manager.get_user_data(phone)
+    user_data = await bot_manager.aget_user_data(phone)
     sources = user_data.get('sources', {})
     destinations = user_data.get('destinations', {})
     
@@ -677,7 +677,7 @@ async def async_forward_messages(query, phone, source_id, destination_id):
     """Asynchronous wrapper for the forwarding process."""
     try:
         # Call the bot manager's forwarding method
-        bot_manager.start_forwarding(phone, source_id, destination_id)
+        await bot_manager.astart_forwarding(phone, source_id, destination_id)
     except Exception as e:
         logger.error(f"Error in async_forward_messages: {str(e)}")
 
@@ -746,7 +746,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         api_hash = sessions[user_id]['api_hash']
         
         try:
-            result = bot_manager.initialize_bot(phone, api_id, api_hash)
+            result = await bot_manager.ainitialize_bot(phone, api_id, api_hash)
             
             if result.get('needs_code'):
                 user_states[user_id] = STATE_AWAITING_CODE
@@ -773,7 +773,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         phone = sessions[user_id]['phone']
         
         try:
-            result = bot_manager.submit_code(phone, code)
+            result = await bot_manager.asubmit_code(phone, code)
             
             if result.get('success'):
                 user_states[user_id] = STATE_INITIAL
@@ -799,7 +799,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         phone = sessions[user_id]['phone']
         
         try:
-            result = bot_manager.add_source(phone, source_link)
+            result = await bot_manager.aadd_source(phone, source_link)
             
             if result.get('success'):
                 user_states[user_id] = STATE_INITIAL
@@ -830,7 +830,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         phone = sessions[user_id]['phone']
         
         try:
-            result = bot_manager.add_destination(phone, destination_link)
+            result = await bot_manager.aadd_destination(phone, destination_link)
             
             if result.get('success'):
                 user_states[user_id] = STATE_INITIAL
@@ -873,7 +873,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         
         try:
             # Set the last message
-            result = bot_manager.set_last_message(phone, source_id, last_message_link)
+            result = await bot_manager.aset_last_message(phone, source_id, last_message_link)
             
             if result.get('success'):
                 # Start forwarding
@@ -916,7 +916,7 @@ async def logout_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     phone = sessions.get(user_id, {}).get('phone')
     
     if phone:
-        bot_manager.logout_user(phone)
+        await bot_manager.alogout_user(phone)
         if user_id in sessions:
             del sessions[user_id]
         
@@ -1,10 +1,11 @@
 import os
+import atexit
 import logging
 import asyncio
 from telethon import TelegramClient, events
 from telethon.tl.custom import Button
 from bot_manager import BotManager
-from storage import Storage
+from storage import get_storage
 
 # Enable logging
 logging.basicConfig(
@@ -15,9 +16,12 @@ logger = logging.getLogger(__name__)
 
 # Global variables
 bot_manager = BotManager()
-storage = Storage()
+storage = get_storage()
 user_sessions = {}  # Maps user_id to session data
 
+# Make sure buffered forwarding progress reaches storage on exit
+atexit.register(bot_manager.shutdown)
+
 # State constants
 STATE_INITIAL = 0
 STATE_AWAITING_API_ID = 1
@@ -29,6 +33,8 @@ STATE_AWAITING_DESTINATION = 6
 STATE_AWAITING_LAST_MESSAGE = 7
 STATE_SELECTING_SOURCE = 8
 STATE_SELECTING_DESTINATION = 9
+STATE_AWAITING_BULK_SOURCES = 10
+STATE_AWAITING_BULK_DESTINATIONS = 11
 
 # Create your Telegram bot client
 bot_token = os.environ.get("TELEGRAM_BOT_TOKEN")
@@ -73,6 +79,8 @@ async def help_command(event):
         "/login - Login with your Telegram API credentials\n"
         "/sources - Manage your source channels\n"
         "/destinations - Manage your destination channels\n"
+        "/import_sources - Add many source channels from a list or a .txt file\n"
+        "/import_destinations - Add many destination channels from a list or a .txt file\n"
         "/forward - Start forwarding messages\n"
         "/status - Check forwarding status\n"
         "/cancel - Cancel active forwarding task\n"
@@ -142,6 +150,8 @@ async def callback_handler(event):
             "/login - Login with your Telegram API credentials\n"
             "/sources - Manage your source channels\n"
             "/destinations - Manage your destination channels\n"
+            "/import_sources - Add many source channels from a list or a .txt file\n"
+            "/import_destinations - Add many destination channels from a list or a .txt file\n"
             "/forward - Start forwarding messages\n"
             "/status - Check forwarding status\n"
             "/cancel - Cancel active forwarding task\n"
@@ -245,7 +255,7 @@ async def callback_handler(event):
     elif data == "logout":
         phone = session.get('phone')
         if phone:
-            result = bot_manager.logout_user(phone)
+            result = await bot_manager.alogout_user(phone)
             user_sessions[user_id] = {}
             
             await event.edit(
@@ -264,7 +274,7 @@ async def callback_handler(event):
         
         if phone:
             try:
-                result = bot_manager.delete_source(phone, source_id)
+                result = await bot_manager.adelete_source(phone, source_id)
                 if result.get('success'):
                     await event.edit(
                         "✅ Source deleted successfully.",
@@ -292,7 +302,7 @@ async def callback_handler(event):
         
         if phone:
             try:
-                result = bot_manager.delete_destination(phone, destination_id)
+                result = await bot_manager.adelete_destination(phone, destination_id)
                 if result.get('success'):
                     await event.edit(
                         "✅ Destination deleted successfully.",
@@ -370,7 +380,7 @@ async def callback_handler(event):
         phone = session.get('phone')
         if phone:
             try:
-                bot_manager.start_forwarding(phone, source_id, destination_id)
+                await bot_manager.astart_forwarding(phone, source_id, destination_id)
                 
                 await event.edit(
                     "✅ Forwarding task has been started!\n\n"
@@ -450,7 +460,7 @@ async def message_handler(event):
         api_hash = session['api_hash']
         
         try:
-            result = bot_manager.initialize_bot(phone, api_id, api_hash)
+            result = await bot_manager.ainitialize_bot(phone, api_id, api_hash)
             
             if result.get('needs_code'):
                 session['state'] = STATE_AWAITING_CODE
@@ -475,7 +485,7 @@ async def message_handler(event):
         phone = session['phone']
         
         try:
-            result = bot_manager.submit_code(phone, code)
+            result = await bot_manager.asubmit_code(phone, code)
             
             if result.get('success'):
                 session['state'] = STATE_INITIAL
@@ -499,7 +509,7 @@ async def message_handler(event):
         phone = session['phone']
         
         try:
-            result = bot_manager.add_source(phone, source_link)
+            result = await bot_manager.aadd_source(phone, source_link)
             
             if result.get('success'):
                 session['state'] = STATE_INITIAL
@@ -529,7 +539,7 @@ async def message_handler(event):
         phone = session['phone']
         
         try:
-            result = bot_manager.add_destination(phone, destination_link)
+            result = await bot_manager.aadd_destination(phone, destination_link)
             
             if result.get('success'):
                 session['state'] = STATE_INITIAL
@@ -554,6 +564,51 @@ async def message_handler(event):
                 "Please try again or send /cancel to cancel."
             )
     
+    elif state in (STATE_AWAITING_BULK_SOURCES, STATE_AWAITING_BULK_DESTINATIONS):
+        kind = 'source' if state == STATE_AWAITING_BULK_SOURCES else 'destination'
+        phone = session['phone']
+        
+        try:
+            # Links come as message text or as an attached text file
+            links = message_text or ''
+            if event.message.document:
+                links += '\n' + (await event.message.download_media(bytes)).decode('utf-8', errors='ignore')
+            
+            if not links.strip():
+                await event.respond("Please send the links as text or as a .txt file, or send /cancel to cancel.")
+                return
+            
+            progress_message = await event.respond("⏳ Importing, this may take a while for long lists...")
+            result = await bot_manager.abulk_import(phone, kind, links)
+            session['state'] = STATE_INITIAL
+            
+            if not result.get('success'):
+                await progress_message.edit(f"❌ Error importing: {result.get('error', 'Unknown error')}")
+                return
+            
+            report = (
+                f"✅ Import finished\n\n"
+                f"Added: {result['added']}\n"
+                f"Already added: {result['exists']}\n"
+                f"Failed: {result['failed']}"
+            )
+            failures = [item for item in result['results'] if item['status'] == 'failed']
+            if failures:
+                report += "\n\nFailed links:\n" + "\n".join(f"• {item['link']}: {item['error']}" for item in failures[:20])
+                if len(failures) > 20:
+                    report += f"\n...and {len(failures) - 20} more"
+            
+            menu = b"sources_menu" if kind == 'source' else b"destinations_menu"
+            await progress_message.edit(report, buttons=[
+                [Button.inline("Sources Menu" if kind == 'source' else "Destinations Menu", menu)],
+                [Button.inline("Main Menu", b"back_to_main")]
+            ])
+        except Exception as e:
+            await event.respond(
+                f"❌ Error: {str(e)}\n\n"
+                "Please try again or send /cancel to cancel."
+            )
+    
     elif state == STATE_AWAITING_LAST_MESSAGE:
         last_message_link = message_text
         phone = session['phone']
@@ -569,11 +624,11 @@ async def message_handler(event):
         
         try:
             # Set the last message
-            result = bot_manager.set_last_message(phone, source_id, last_message_link)
+            result = await bot_manager.aset_last_message(phone, source_id, last_message_link)
             
             if result.get('success'):
                 # Start forwarding
-                bot_manager.start_forwarding(phone, source_id, destination_id)
+                await bot_manager.astart_forwarding(phone, source_id, destination_id)
                 
                 session['state'] = STATE_INITIAL
                 
@@ -651,7 +706,7 @@ async def show_sources_menu(event, user_id):
         )
         return
     
-    user_data = bot_manager.get_user_data(phone)
+    user_data = await bot_manager.aget_user_data(phone)
     sources = user_data.get('sources', {})
     
     if not sources:
@@ -695,7 +750,7 @@ async def show_destinations_menu(event, user_id):
         )
         return
     
-    user_data = bot_manager.get_user_data(phone)
+    user_data = await bot_manager.aget_user_data(phone)
     destinations = user_data.get('destinations', {})
     
     if not destinations:
@@ -739,7 +794,7 @@ async def show_forwarding_menu(event, user_id):
         )
         return
     
-    user_data = bot_manager.get_user_data(phone)
+    user_data = await bot_manager.aget_user_data(phone)
     sources = user_data.get('sources', {})
     
     if not sources:
@@ -781,7 +836,7 @@ async def show_destinations_for_forwarding(event, user_id):
         )
         return
     
-    user_data = bot_manager.get_user_data(phone)
+    user_data = await bot_manager.aget_user_data(phone)
     destinations = user_data.get('destinations', {})
     
     if not destinations:
@@ -833,7 +888,7 @@ async def show_status(event, user_id):
         return
     
     # Get source and destination names
-    user_data = bot_manager.get_user_data(phone)
+    user_data = await bot_manager.aget_user_data(phone)
     sources = user_data.get('sources', {})
     destinations = user_data.get('destinations', {})
     
@@ -892,7 +947,7 @@ async def logout_command(event):
     
     phone = user_sessions[user_id].get('phone')
     if phone:
-        bot_manager.logout_user(phone)
+        await bot_manager.alogout_user(phone)
         user_sessions[user_id] = {}
         
         await event.respond(
@@ -927,6 +982,34 @@ async def destinations_command(event):
     # Update the message with the destinations menu
     await show_destinations_menu(response, user_id)
 
+async def start_bulk_import(event, state, kind):
+    """Ask a logged-in user for the links of a bulk import."""
+    user_id = event.sender_id
+    session = user_sessions.setdefault(user_id, {'state': STATE_INITIAL})
+    
+    if not session.get('phone'):
+        await event.respond(
+            "❌ You are not logged in. Please login first.",
+            buttons=[Button.inline("Main Menu", b"back_to_main")]
+        )
+        return
+    
+    session['state'] = state
+    await event.respond(
+        f"Send the {kind} links to import, one per line, or upload them as a .txt file.\n\n"
+        "Send /cancel to cancel."
+    )
+
+@bot.on(events.NewMessage(pattern='/import_sources'))
+async def import_sources_command(event):
+    """Handle the /import_sources command."""
+    await start_bulk_import(event, STATE_AWAITING_BULK_SOURCES, 'source')
+
+@bot.on(events.NewMessage(pattern='/import_destinations'))
+async def import_destinations_command(event):
+    """Handle the /import_destinations command."""
+    await start_bulk_import(event, STATE_AWAITING_BULK_DESTINATIONS, 'destination')
+
 @bot.on(events.NewMessage(pattern='/forward'))
 async def forward_command(event):
     """Handle the /forward command."""